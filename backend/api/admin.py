@@ -2,7 +2,6 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     Recipe,
-    Favorite,
     Ingredient,
     RecipeIngredient,
     ShoppingCart,
@@ -16,9 +15,10 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
     def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     favorite_count.short_description = "В избранном"
+    favorite_count.admin_order_field = "favorites_count"
 
 
 admin.site.register(Recipe, RecipeAdmin)
@@ -0,0 +1,361 @@
+"""Асинхронные представления для самых частых запросов на чтение.
+
+Подключаются настройкой ASYNC_READ_VIEWS и рассчитаны на запуск под
+ASGI (см. README). Обслуживают обычные GET-запросы через async ORM,
+а сериализацию и проверку пароля выполняют в пуле потоков. Все
+остальное (запись, ?cursor=, незнакомые параметры, ошибки) передается
+обычным представлениям DRF, поэтому ответы не отличаются.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import CachedJWTAuthentication
+from .caching import response_cache_key
+from .catalog import catalog
+from .conditional import make_validators, set_validators
+from .membership import get_membership
+from .models import Recipe
+from .pagination import CustomPagination
+from .serializers import (
+    RecipeReadSerializer,
+    SubscriptionSerializer,
+    get_recipes_limit,
+)
+from .utils import TRUE_VALUES
+from .views import (
+    CATALOG_PARAMS,
+    CustomTokenLoginView,
+    IngredientViewSet,
+    RecipeViewSet,
+    UserViewSet,
+)
+from users.models import Subscription, User
+
+RESPONSE_FORMAT = "json"
+IMAGE_PARAMS = {"image_size", "inline_images"}
+PAGE_PARAMS = {"page", "limit"}
+RECIPE_LIST_PARAMS = (
+    PAGE_PARAMS
+    | IMAGE_PARAMS
+    | {"author", "is_favorited", "is_in_shopping_cart"}
+)
+SUBSCRIPTION_PARAMS = PAGE_PARAMS | IMAGE_PARAMS | {"recipes_limit"}
+LOGIN_ERROR = {"auth_token": ["Неверные учетные данные"]}
+
+recipe_list_view = RecipeViewSet.as_view({"get": "list", "post": "create"})
+recipe_detail_view = RecipeViewSet.as_view(
+    {
+        "get": "retrieve",
+        "put": "update",
+        "patch": "partial_update",
+        "delete": "destroy",
+    }
+)
+ingredient_list_view = IngredientViewSet.as_view({"get": "list"})
+subscriptions_view = UserViewSet.as_view({"get": "subscriptions"})
+login_view = CustomTokenLoginView.as_view()
+authenticator = CachedJWTAuthentication()
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type="application/json",
+    )
+
+
+async def delegate(view, request, *args, **kwargs):
+    """Передает запрос синхронному представлению DRF."""
+    return await sync_to_async(view)(request, *args, **kwargs)
+
+
+async def authenticate_request(request):
+    """Ставит request.user по JWT, False - если токен неверный."""
+    try:
+        result = await authenticator.aauthenticate(request)
+    except AuthenticationFailed:
+        return False
+    request.user = result[0] if result else AnonymousUser()
+    return True
+
+
+def get_page_bounds(request):
+    """Номер и размер страницы, None - разбор оставляем DRF."""
+    try:
+        page = int(request.GET.get("page", 1))
+        limit = int(request.GET.get("limit", CustomPagination.page_size))
+    except ValueError:
+        return None
+    if page < 1 or limit < 1:
+        return None
+    return page, min(limit, CustomPagination.max_page_size)
+
+
+def paginated(request, count, page, limit, results):
+    url = request.build_absolute_uri()
+    next_url = None
+    if page * limit < count:
+        next_url = replace_query_param(url, "page", page + 1)
+    previous_url = None
+    if page == 2:
+        previous_url = remove_query_param(url, "page")
+    elif page > 2:
+        previous_url = replace_query_param(url, "page", page - 1)
+    return {
+        "count": count,
+        "next": next_url,
+        "previous": previous_url,
+        "results": results,
+    }
+
+
+async def conditional_read(request, validators, tags, build):
+    """Проверка ETag и анонимный кэш ответа вокруг build().
+
+    Повторяет ConditionalGetMixin и AnonymousCacheMixin синхронных
+    представлений, ключи кэша у них общие. Если build() вернул None,
+    возвращает None: ответ нужно получить у синхронного представления.
+    """
+    etag, last_modified = await sync_to_async(make_validators)(
+        request, RESPONSE_FORMAT, *validators
+    )
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return not_modified
+
+    key = None
+    if not request.user.is_authenticated:
+        key = await sync_to_async(response_cache_key)(
+            request, tags, RESPONSE_FORMAT
+        )
+        data = await cache.aget(key)
+        if data is not None:
+            return set_validators(json_response(data), etag, last_modified)
+
+    data = await build()
+    if data is None:
+        return None
+    if key is not None:
+        await cache.aset(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return set_validators(json_response(data), etag, last_modified)
+
+
+def serialize_recipes(request, recipes, many):
+    return RecipeReadSerializer(
+        recipes, many=many, context={"request": request}
+    ).data
+
+
+@csrf_exempt
+async def recipe_list(request):
+    if (
+        request.method != "GET"
+        or not set(request.GET) <= RECIPE_LIST_PARAMS
+        or not await authenticate_request(request)
+    ):
+        return await delegate(recipe_list_view, request)
+    bounds = get_page_bounds(request)
+    if bounds is None:
+        return await delegate(recipe_list_view, request)
+    page, limit = bounds
+
+    recipes = Recipe.objects.for_fragments()
+    author = request.GET.get("author")
+    if author is not None:
+        if not author.isdigit() or not await User.objects.filter(
+            pk=author
+        ).aexists():
+            return await delegate(recipe_list_view, request)
+        recipes = recipes.filter(author_id=author)
+    for param, kind in (
+        ("is_favorited", "favorites"),
+        ("is_in_shopping_cart", "cart"),
+    ):
+        value = request.GET.get(param, "").lower()
+        if value in TRUE_VALUES and request.user.is_authenticated:
+            membership = await sync_to_async(get_membership)(request, kind)
+            recipes = recipes.filter(id__in=list(membership))
+
+    async def build():
+        count = await recipes.acount()
+        if page > 1 and (page - 1) * limit >= count:
+            return None
+        offset = (page - 1) * limit
+        page_recipes = [
+            recipe async for recipe in recipes[offset:offset + limit]
+        ]
+        results = await sync_to_async(serialize_recipes)(
+            request, page_recipes, True
+        )
+        return paginated(request, count, page, limit, results)
+
+    response = await conditional_read(
+        request,
+        (
+            None,
+            (),
+            RecipeViewSet.validator_tags,
+            RecipeViewSet.membership_kinds,
+        ),
+        RecipeViewSet.cache_tags,
+        build,
+    )
+    if response is None:
+        return await delegate(recipe_list_view, request)
+    return response
+
+
+@csrf_exempt
+async def recipe_detail(request, pk):
+    if (
+        request.method != "GET"
+        or not set(request.GET) <= IMAGE_PARAMS
+        or not await authenticate_request(request)
+    ):
+        return await delegate(recipe_detail_view, request, pk=pk)
+    recipe = await Recipe.objects.for_fragments().filter(pk=pk).afirst()
+    if recipe is None:
+        return await delegate(recipe_detail_view, request, pk=pk)
+
+    async def build():
+        return await sync_to_async(serialize_recipes)(request, recipe, False)
+
+    return await conditional_read(
+        request,
+        (
+            1,
+            [recipe.updated_at, recipe.author.updated_at],
+            RecipeViewSet.validator_tags,
+            RecipeViewSet.membership_kinds,
+        ),
+        RecipeViewSet.cache_tags,
+        build,
+    )
+
+
+@csrf_exempt
+async def ingredient_list(request):
+    params = request.GET
+    if request.method != "GET" or not set(params) <= CATALOG_PARAMS:
+        return await delegate(ingredient_list_view, request)
+    prefix = params.get("name") or params.get("name__istartswith", "")
+    substring = params.get("name__icontains", "")
+    etag, last_modified = await sync_to_async(make_validators)(
+        request,
+        RESPONSE_FORMAT,
+        None,
+        (),
+        IngredientViewSet.validator_tags,
+        (),
+    )
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return not_modified
+    content = await sync_to_async(catalog.search)(
+        prefix=prefix, substring=substring
+    )
+    return set_validators(
+        HttpResponse(content, content_type="application/json"),
+        etag,
+        last_modified,
+    )
+
+
+@csrf_exempt
+async def subscriptions(request):
+    if (
+        request.method != "GET"
+        or not set(request.GET) <= SUBSCRIPTION_PARAMS
+        or not await authenticate_request(request)
+        or not request.user.is_authenticated
+    ):
+        return await delegate(subscriptions_view, request)
+    bounds = get_page_bounds(request)
+    if bounds is None:
+        return await delegate(subscriptions_view, request)
+    page, limit = bounds
+
+    queryset = Subscription.objects.filter(user=request.user)
+    count = await queryset.acount()
+    if page > 1 and (page - 1) * limit >= count:
+        return await delegate(subscriptions_view, request)
+    offset = (page - 1) * limit
+    page_subscriptions = [
+        subscription
+        async for subscription in queryset.select_related("author")
+        .order_by("-id")[offset:offset + limit]
+    ]
+    recipes_by_author = {}
+    async for recipe in Recipe.objects.latest_per_author(
+        [subscription.author_id for subscription in page_subscriptions],
+        get_recipes_limit(request),
+    ).order_by("author_id", "-pub_date", "-id"):
+        recipes_by_author.setdefault(recipe.author_id, []).append(recipe)
+
+    results = await sync_to_async(
+        lambda: SubscriptionSerializer(
+            page_subscriptions,
+            many=True,
+            context={
+                "request": request,
+                "recipes_by_author": recipes_by_author,
+            },
+        ).data
+    )()
+    return json_response(paginated(request, count, page, limit, results))
+
+
+@csrf_exempt
+async def login(request):
+    """Выдача токена с проверкой пароля в пуле потоков.
+
+    Хэширование пароля занимает процессор на десятки миллисекунд,
+    поэтому оно не должно блокировать цикл событий.
+    """
+    if request.method != "POST":
+        return await delegate(login_view, request)
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return json_response(LOGIN_ERROR, status.HTTP_400_BAD_REQUEST)
+    else:
+        data = request.POST
+    email = data.get("email")
+    password = data.get("password")
+    if not email or not password:
+        return json_response(LOGIN_ERROR, status.HTTP_400_BAD_REQUEST)
+
+    user = await User.objects.filter(email=email).afirst()
+    if user is None:
+        # Хэшируем и для несуществующего пользователя, чтобы время
+        # ответа не выдавало, зарегистрирован ли email
+        await sync_to_async(make_password, thread_sensitive=False)(password)
+        return json_response(LOGIN_ERROR, status.HTTP_400_BAD_REQUEST)
+    valid = await sync_to_async(check_password, thread_sensitive=False)(
+        password, user.password
+    )
+    if not valid or not user.is_active:
+        return json_response(LOGIN_ERROR, status.HTTP_400_BAD_REQUEST)
+
+    refresh = RefreshToken.for_user(user)
+    return json_response({"auth_token": str(refresh.access_token)})
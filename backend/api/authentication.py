@@ -0,0 +1,131 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from api.utils import LRUCache
+from users.models import User
+
+USERS_CACHE_SIZE = 10000
+
+
+class UserCache:
+    """Кэш пользователей в памяти процесса с коротким временем жизни.
+
+    Хранит значения полей, а не сам объект, чтобы каждый запрос получал
+    собственный экземпляр User.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.entries = LRUCache(maxsize, ttl=ttl)
+        self.field_names = [
+            field.attname for field in User._meta.concrete_fields
+        ]
+
+    def get(self, user_id):
+        values = self.entries.get(user_id)
+        if values is None:
+            return None
+        return User.from_db(DEFAULT_DB_ALIAS, self.field_names, values)
+
+    def set(self, user):
+        self.entries.set(
+            user.pk, [getattr(user, name) for name in self.field_names]
+        )
+
+    def invalidate(self, user_id):
+        self.entries.delete(user_id)
+
+
+cached_users = UserCache(USERS_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запроса пользователя к базе на каждый запрос.
+
+    Подпись токена проверяется как обычно, а пользователь берется из
+    cached_users. Кэш сбрасывается при сохранении пользователя
+    (см. api.signals), в других процессах запись живет не дольше
+    AUTH_USER_CACHE_TTL секунд. Изменяющие запросы всегда читают
+    пользователя из базы: сохранение устаревшей копии затерло бы
+    изменения из других процессов, например новый пароль.
+    """
+
+    def authenticate(self, request):
+        validated_token = self.get_token(request)
+        if validated_token is None:
+            return None
+        if request.method in SAFE_METHODS:
+            return self.get_user(validated_token), validated_token
+        return self.get_fresh_user(validated_token), validated_token
+
+    def get_token(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return self.get_validated_token(raw_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("В токене нет идентификатора пользователя")
+
+    def check_user(self, user, validated_token):
+        """Проверки JWTAuthentication.get_user после поиска пользователя."""
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(
+                "Пользователь неактивен", code="user_inactive"
+            )
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                "Пароль пользователя изменен", code="password_changed"
+            )
+        return user
+
+    def get_user(self, validated_token):
+        user = cached_users.get(self.get_user_id(validated_token))
+        if user is None:
+            return self.get_fresh_user(validated_token)
+        return self.check_user(user, validated_token)
+
+    def get_fresh_user(self, validated_token):
+        user = super().get_user(validated_token)
+        cached_users.set(user)
+        return user
+
+    async def aauthenticate(self, request):
+        """То же, что authenticate, но пользователя читает async ORM.
+
+        Асинхронные представления только читают данные.
+        """
+        validated_token = self.get_token(request)
+        if validated_token is None:
+            return None
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = cached_users.get(user_id)
+        if user is None:
+            try:
+                user = await User.objects.aget(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except User.DoesNotExist:
+                raise AuthenticationFailed(
+                    "Пользователь не найден", code="user_not_found"
+                )
+        self.check_user(user, validated_token)
+        cached_users.set(user)
+        return user
@@ -0,0 +1,132 @@
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from django.utils.connection import ConnectionProxy
+from rest_framework.response import Response
+
+TAG_VERSION_KEY = "responses:tag:{}"
+RESPONSE_KEY = "responses:{}"
+FRAGMENT_KEY = "fragments:recipe:{}:{}:{}:{}"
+MEMBERSHIP_KEY = "membership:{}:{}"
+POSTING_KEY = "postings:ingredient:{}"
+
+# Кэш версий: не вытесняется вместе с ответами и фрагментами
+versions = ConnectionProxy(caches, "versions")
+
+
+def tag_versions(tags):
+    """Текущие версии тегов, недостающие создаются."""
+    keys = [TAG_VERSION_KEY.format(tag) for tag in tags]
+    current = versions.get_many(keys)
+    for key in keys:
+        if key not in current:
+            current[key] = versions.get_or_set(key, uuid.uuid4().hex, None)
+    return [current[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    """Делает недействительными все ответы, помеченные этими тегами."""
+    versions.set_many(
+        {TAG_VERSION_KEY.format(tag): uuid.uuid4().hex for tag in tags},
+        None,
+    )
+
+
+def invalidate_membership(user_id, kind):
+    """Сбрасывает множество пользователя после фиксации транзакции."""
+    key = MEMBERSHIP_KEY.format(user_id, kind)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_postings(ingredient_ids):
+    """Сбрасывает списки рецептов ингредиентов после фиксации."""
+    keys = [POSTING_KEY.format(pk) for pk in set(ingredient_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def response_cache_key(request, tags, response_format):
+    """Ключ ответа: адрес с упорядоченными параметрами, формат и теги."""
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    parts = [
+        request.build_absolute_uri(request.path),
+        query,
+        response_format,
+        *tag_versions(tags),
+    ]
+    digest = hashlib.sha1("\n".join(parts).encode()).hexdigest()
+    return RESPONSE_KEY.format(digest)
+
+
+def fragment_variant(request):
+    """Часть ключа фрагмента, которая зависит от запроса, но не от зрителя.
+
+    В фрагмент попадают адрес сайта и размер изображения, а также
+    названия ингредиентов, поэтому учитывается версия их тега.
+    """
+    params = request.GET if request is not None else {}
+    parts = [
+        request.build_absolute_uri("/") if request is not None else "",
+        params.get("image_size", ""),
+        params.get("inline_images", ""),
+        str(settings.IMAGE_INLINE_BASE64),
+        *tag_versions(("ingredients",)),
+    ]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def recipe_fragment_key(recipe, variant):
+    """Ключ фрагмента, меняется при правке рецепта или его автора."""
+    return FRAGMENT_KEY.format(
+        recipe.pk,
+        recipe.updated_at.timestamp(),
+        recipe.author.updated_at.timestamp(),
+        variant,
+    )
+
+
+class AnonymousCacheMixin:
+    """Кэширует list и retrieve для анонимных пользователей.
+
+    Закэшированный ответ сбрасывается, когда меняется версия любого
+    из тегов cache_tags (см. invalidate_tags).
+    """
+
+    cache_tags = ()
+
+    def cached_response(self, request, build):
+        if (
+            request.method not in SAFE_METHODS
+            or request.user.is_authenticated
+        ):
+            return build()
+        key = response_cache_key(
+            request, self.cache_tags, request.accepted_renderer.format
+        )
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(AnonymousCacheMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(AnonymousCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
@@ -0,0 +1,86 @@
+import bisect
+import json
+import threading
+import uuid
+
+from api.caching import versions
+from api.models import Ingredient
+from api.utils import LRUCache
+
+CATALOG_VERSION_KEY = "ingredients:catalog:version"
+HOT_QUERIES_SIZE = 1024
+
+
+class IngredientCatalog:
+    """Справочник ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся отсортированными в нижнем регистре, поиск по началу
+    названия делается бинарным поиском. Готовые JSON-ответы на частые
+    запросы лежат в LRU-кэше. Справочник перечитывается, когда меняется
+    версия в общем кэше Django (см. invalidate).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.names = []
+        self.items = []
+        self.responses = LRUCache(HOT_QUERIES_SIZE)
+        self.lock = threading.Lock()
+
+    def ensure_fresh(self):
+        version = versions.get_or_set(
+            CATALOG_VERSION_KEY, uuid.uuid4().hex, None
+        )
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            items = sorted(
+                Ingredient.objects.values("id", "name", "measurement_unit"),
+                key=lambda item: (item["name"].casefold(), item["id"]),
+            )
+            self.names = [item["name"].casefold() for item in items]
+            self.items = items
+            self.responses.clear()
+            self.version = version
+
+    def find_prefix(self, prefix):
+        start = bisect.bisect_left(self.names, prefix)
+        end = start
+        while end < len(self.names) and self.names[end].startswith(prefix):
+            end += 1
+        return self.items[start:end]
+
+    def find_substring(self, substring):
+        return [
+            item
+            for name, item in zip(self.names, self.items)
+            if substring in name
+        ]
+
+    def search(self, prefix="", substring=""):
+        """JSON-ответ со списком ингредиентов, отобранных по названию."""
+        self.ensure_fresh()
+        key = (prefix.casefold(), substring.casefold())
+        response = self.responses.get(key)
+        if response is None:
+            if key[0]:
+                items = [
+                    item
+                    for item in self.find_prefix(key[0])
+                    if key[1] in item["name"].casefold()
+                ]
+            else:
+                items = self.find_substring(key[1])
+            response = json.dumps(items, ensure_ascii=False).encode()
+            self.responses.set(key, response)
+        return response
+
+    def invalidate(self):
+        """Сбрасывает справочник во всех процессах."""
+        versions.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        self.version = None
+
+
+catalog = IngredientCatalog()
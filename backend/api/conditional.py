@@ -0,0 +1,106 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+
+from api.caching import tag_versions
+from api.membership import get_membership
+
+
+def make_validators(request, response_format, count, stamps, tags, kinds):
+    """ETag и Last-Modified ответа.
+
+    Если ответ зависит от множеств пользователя kinds, Last-Modified
+    не отдается: по одной дате нельзя понять, что они изменились.
+    """
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    parts = [
+        request.get_full_path(),
+        response_format,
+        str(count),
+        *(stamp.isoformat() for stamp in stamps),
+        *tag_versions(tags),
+    ]
+    per_user = bool(kinds) and request.user.is_authenticated
+    if per_user:
+        parts.append(str(request.user.pk))
+        parts.extend(get_membership(request, kind).digest() for kind in kinds)
+    etag = quote_etag(hashlib.sha1("\n".join(parts).encode()).hexdigest())
+    last_modified = None
+    if stamps and not per_user:
+        last_modified = int(max(stamps).timestamp())
+    return etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == status.HTTP_200_OK:
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve, 304 без сериализации.
+
+    Валидатор строится по версиям тегов validator_tags, для retrieve
+    также по полям validator_fields объекта и, для авторизованных
+    пользователей, по множествам membership_kinds. Теги сбрасываются
+    при любом изменении объектов списка (см. api.signals), поэтому
+    список проверяется без запросов к базе. Last-Modified отдается,
+    только если ответ не зависит от пользователя.
+    """
+
+    validator_fields = ("updated_at",)
+    validator_tags = ()
+    membership_kinds = ()
+
+    def get_validators(self):
+        """Отметки времени и количество объектов ответа."""
+        if self.action != "retrieve":
+            return (), None
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        stamps = (
+            self.get_queryset()
+            .filter(**{self.lookup_field: lookup})
+            .values_list(*self.validator_fields)
+            .first()
+        )
+        return stamps, int(stamps is not None)
+
+    def conditional_response(self, request, build):
+        if request.method not in SAFE_METHODS:
+            return build()
+        stamps, count = self.get_validators()
+        if self.action == "retrieve" and not count:
+            return build()
+        etag, last_modified = make_validators(
+            request,
+            request.accepted_renderer.format,
+            count,
+            stamps,
+            self.validator_tags,
+            self.membership_kinds,
+        )
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+        return set_validators(build(), etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
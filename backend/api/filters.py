@@ -1,7 +1,39 @@
+from django.conf import settings
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+from django.db.models.functions import Coalesce
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 import django_filters
-from .models import Ingredient, Recipe
+from .membership import get_membership
+from .models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeSearchDocument,
+)
+from .postings import intersect, load_postings, union
+
+INGREDIENTS_MODES = (
+    ("all", "Все ингредиенты"),
+    ("any", "Любой из ингредиентов"),
+    ("none", "Ни одного из ингредиентов"),
+)
+
+
+# Сортировки по таблицам лидеров: позиция рецепта в выдаче. Рецепты
+# без места в таблице идут после всех, по дате публикации
+UNRANKED = 2**31 - 1
+ORDERING_POSITIONS = {
+    "popular": Coalesce("ranking__popular_rank", Value(UNRANKED)),
+    "trending": Coalesce("ranking__trending_rank", Value(UNRANKED)),
+    "cooking_time": F("cooking_time"),
+}
+# Позиция идет первой, поэтому по ней же строится ?cursor=
+POSITION_ORDERING = ("position", "-pub_date", "-id")
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class IngredientFilter(django_filters.FilterSet):
@@ -21,17 +53,90 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="filter_search")
+    ingredients = NumberInFilter(method="filter_ingredients")
+    ingredients_mode = filters.ChoiceFilter(
+        choices=INGREDIENTS_MODES, method="filter_ingredients_mode"
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ("popular", "По популярности"),
+            ("trending", "Сейчас в тренде"),
+            ("cooking_time", "По времени приготовления"),
+        ),
+        method="filter_ordering",
+    )
 
     class Meta:
         model = Recipe
-        fields = ("author", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+            "ingredients",
+            "ingredients_mode",
+            "ordering",
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(
+                id__in=list(get_membership(self.request, "favorites"))
+            )
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_carts__user=self.request.user)
+            return queryset.filter(
+                id__in=list(get_membership(self.request, "cart"))
+            )
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Рецепты, подходящие под запрос, от лучшего совпадения."""
+        ids = RecipeSearchDocument.objects.search(
+            value, settings.SEARCH_RESULTS_LIMIT
+        )
+        if not ids:
+            return queryset.none()
+        return queryset.filter(id__in=ids).order_by(
+            Case(*(When(id=pk, then=rank) for rank, pk in enumerate(ids)))
+        )
+
+    def filter_ingredients(self, queryset, name, value):
+        """Рецепты со всеми (all), любым (any) или без (none) ингредиентов.
+
+        all и any считаются по спискам рецептов ингредиентов из кэша,
+        в запрос уходят только INGREDIENT_FILTER_LIMIT самых новых
+        рецептов (с наибольшими id). Для none список исключаемых
+        рецептов может быть огромным, поэтому его проверяет база по
+        индексу связи рецепт-ингредиент.
+        """
+        ingredient_ids = list(dict.fromkeys(int(pk) for pk in value))
+        if not ingredient_ids:
+            return queryset
+        mode = self.form.cleaned_data.get("ingredients_mode") or "all"
+        if mode == "none":
+            return queryset.exclude(
+                Exists(
+                    RecipeIngredient.objects.filter(
+                        recipe=OuterRef("pk"),
+                        ingredient_id__in=ingredient_ids,
+                    )
+                )
+            )
+        postings = load_postings(ingredient_ids)
+        recipe_ids = intersect(postings) if mode == "all" else union(postings)
+        limit = settings.INGREDIENT_FILTER_LIMIT
+        return queryset.filter(id__in=recipe_ids[-limit:])
+
+    def filter_ingredients_mode(self, queryset, name, value):
+        """Режим учитывается в filter_ingredients."""
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по местам из RecipeRanking, без подсчета на лету."""
+        return queryset.annotate(
+            position=ORDERING_POSITIONS[value]
+        ).order_by(*POSITION_ORDERING)
@@ -0,0 +1,70 @@
+import hashlib
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.caching import MEMBERSHIP_KEY
+from api.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+# Вид множества: модель связи и поле с id рецепта или автора
+SOURCES = {
+    "favorites": (Favorite, "recipe_id"),
+    "cart": (ShoppingCart, "recipe_id"),
+    "follows": (Subscription, "author_id"),
+}
+
+
+class Membership:
+    """Отсортированный массив id рецептов или авторов."""
+
+    def __init__(self, ids=()):
+        self.ids = array("q", sorted(ids))
+
+    def __contains__(self, value):
+        index = bisect_left(self.ids, value)
+        return index < len(self.ids) and self.ids[index] == value
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def digest(self):
+        return hashlib.sha1(self.ids.tobytes()).hexdigest()
+
+
+EMPTY = Membership()
+
+
+def load_memberships(user):
+    """Все множества пользователя: одно чтение кэша, промахи из базы."""
+    keys = {kind: MEMBERSHIP_KEY.format(user.pk, kind) for kind in SOURCES}
+    cached = cache.get_many(keys.values())
+    memberships = {}
+    for kind, key in keys.items():
+        if key in cached:
+            memberships[kind] = cached[key]
+            continue
+        model, field = SOURCES[kind]
+        memberships[kind] = Membership(
+            model.objects.filter(user=user).values_list(field, flat=True)
+        )
+        cache.set(
+            key, memberships[kind], settings.MEMBERSHIP_CACHE_TIMEOUT
+        )
+    return memberships
+
+
+def get_membership(request, kind):
+    """Множество текущего пользователя, прочитанное один раз за запрос."""
+    if request is None or request.user.is_anonymous:
+        return EMPTY
+    memberships = getattr(request, "_memberships", None)
+    if memberships is None:
+        memberships = load_memberships(request.user)
+        request._memberships = memberships
+    return memberships[kind]
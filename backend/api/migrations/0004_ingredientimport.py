@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=64, unique=True, verbose_name='Контрольная сумма')),
+                ('source', models.CharField(max_length=255, verbose_name='Файл')),
+                ('loaded_at', models.DateTimeField(auto_now=True, verbose_name='Дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'Загрузка ингредиентов',
+                'verbose_name_plural': 'Загрузки ингредиентов',
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_feeds(apps, schema_editor):
+    """Ленты существующих подписок, кроме подписок на популярных авторов.
+
+    Рецепты популярных авторов лента читает напрямую.
+    """
+    FeedEntry = apps.get_model("api", "FeedEntry")
+    Subscription = apps.get_model("users", "Subscription")
+    authors = (
+        Subscription.objects.values("author_id")
+        .annotate(followers=Count("id"))
+        .filter(followers__lte=settings.FEED_FANOUT_LIMIT)
+        .values("author_id")
+    )
+    rows = Subscription.objects.filter(
+        author_id__in=authors, author__recipes__isnull=False
+    ).values_list(
+        "user_id",
+        "author_id",
+        "author__recipes__id",
+        "author__recipes__pub_date",
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                author_id=author_id,
+                recipe_id=recipe_id,
+                pub_date=pub_date,
+            )
+            for user_id, author_id, recipe_id, pub_date in rows.iterator()
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_keyset_indexes'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='api.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+                'ordering': ['-pub_date', '-id'],
+                'indexes': [models.Index(fields=['user', '-pub_date', '-id'], name='feed_user_pub_date_idx'), models.Index(fields=['user', 'author'], name='feed_user_author_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry')],
+            },
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
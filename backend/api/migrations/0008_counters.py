@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("api", "Recipe")
+    Favorite = apps.get_model("api", "Favorite")
+    ShoppingCart = apps.get_model("api", "ShoppingCart")
+    User = apps.get_model("users", "User")
+    Subscription = apps.get_model("users", "Subscription")
+    Recipe.objects.update(
+        favorites_count=count_of(Favorite, "recipe"),
+        shopping_carts_count=count_of(ShoppingCart, "recipe"),
+    )
+    User.objects.update(
+        recipes_count=count_of(Recipe, "author"),
+        followers_count=count_of(Subscription, "author"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_feedentry'),
+        ('users', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = "api_recipesearchdocument"
+FTS_TABLE = "api_recipesearchdocument_fts"
+
+POSTGRESQL_INSTALL = (
+    f"ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('russian', document)) STORED",
+    f"CREATE INDEX recipe_search_vector_idx ON {TABLE} "
+    "USING GIN (search_vector)",
+)
+POSTGRESQL_UNINSTALL = (
+    f"ALTER TABLE {TABLE} DROP COLUMN search_vector",
+)
+
+# Внешняя таблица FTS5: текст хранится только в TABLE, индекс
+# поддерживают триггеры
+SQLITE_INSTALL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(document, "
+    f"content='{TABLE}', content_rowid='recipe_id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE} (rowid, document) "
+    "VALUES (new.recipe_id, new.document); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, document) "
+    "VALUES ('delete', old.recipe_id, old.document); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, document) "
+    "VALUES ('delete', old.recipe_id, old.document); "
+    f"INSERT INTO {FTS_TABLE} (rowid, document) "
+    "VALUES (new.recipe_id, new.document); END",
+)
+SQLITE_UNINSTALL = (
+    f"DROP TRIGGER {FTS_TABLE}_ai",
+    f"DROP TRIGGER {FTS_TABLE}_ad",
+    f"DROP TRIGGER {FTS_TABLE}_au",
+    f"DROP TABLE {FTS_TABLE}",
+)
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+
+    return run
+
+
+def fill_documents(apps, schema_editor):
+    Recipe = apps.get_model("api", "Recipe")
+    RecipeIngredient = apps.get_model("api", "RecipeIngredient")
+    RecipeSearchDocument = apps.get_model("api", "RecipeSearchDocument")
+    names = {}
+    for recipe_id, name in RecipeIngredient.objects.values_list(
+        "recipe_id", "ingredient__name"
+    ).iterator():
+        names.setdefault(recipe_id, []).append(name)
+    RecipeSearchDocument.objects.bulk_create(
+        (
+            RecipeSearchDocument(
+                recipe_id=pk,
+                document="\n".join([name, text, *names.get(pk, [])])
+                .lower()
+                .replace("ё", "е"),
+            )
+            for pk, name, text in Recipe.objects.values_list(
+                "id", "name", "text"
+            ).iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_ingredient_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='api.recipe', verbose_name='Рецепт')),
+                ('document', models.TextField(verbose_name='Текст для поиска')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor(
+                {"postgresql": POSTGRESQL_INSTALL, "sqlite": SQLITE_INSTALL}
+            ),
+            run_for_vendor(
+                {
+                    "postgresql": POSTGRESQL_UNINSTALL,
+                    "sqlite": SQLITE_UNINSTALL,
+                }
+            ),
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:15
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_recipesignature_recipebucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='api.recipe', verbose_name='Рецепт')),
+                ('popular_score', models.PositiveIntegerField(default=0, verbose_name='Популярность')),
+                ('popular_rank', models.PositiveIntegerField(null=True, verbose_name='Место по популярности')),
+                ('trending_score', models.FloatField(default=0, verbose_name='Оценка тренда')),
+                ('trending_rank', models.PositiveIntegerField(null=True, verbose_name='Место в трендах')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчета')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+            },
+        ),
+        # Существующим строкам дата не проставляется: иначе все они
+        # попали бы в тренды как добавленные в момент миграции
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, null=True, verbose_name='Дата добавления'),
+        ),
+        # Существующим строкам дата не проставляется: иначе все они
+        # попали бы в тренды как добавленные в момент миграции
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['created_at'], name='favorite_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', '-pub_date', '-id'], name='recipe_cooking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['created_at'], name='shopping_cart_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['popular_rank'], name='ranking_popular_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['trending_rank'], name='ranking_trending_rank_idx'),
+        ),
+    ]
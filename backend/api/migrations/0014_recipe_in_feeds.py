@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def mark_fanned_out(apps, schema_editor):
+    """Отмечает рецепты, которые уже есть в лентах всех подписчиков.
+
+    Остальные рецепты лента будет читать напрямую.
+    """
+    Recipe = apps.get_model("api", "Recipe")
+    FeedEntry = apps.get_model("api", "FeedEntry")
+    Subscription = apps.get_model("users", "Subscription")
+    missing = Subscription.objects.filter(
+        author_id=OuterRef("author_id")
+    ).exclude(
+        Exists(
+            FeedEntry.objects.filter(
+                user_id=OuterRef("user_id"), recipe_id=OuterRef(OuterRef("pk"))
+            )
+        )
+    )
+    Recipe.objects.filter(~Exists(missing)).update(in_feeds=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_rankings'),
+        ('users', '0004_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='in_feeds',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Скопирован в ленты'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'in_feeds'], name='recipe_author_in_feeds_idx'),
+        ),
+        migrations.RunPython(mark_fanned_out, migrations.RunPython.noop),
+    ]
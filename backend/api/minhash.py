@@ -0,0 +1,54 @@
+"""MinHash-подписи составов рецептов и их корзины LSH.
+
+Доля совпавших позиций двух подписей оценивает коэффициент Жаккара
+множеств ингредиентов. Подпись режется на BANDS полос по ROWS
+значений; рецепты, у которых совпала хотя бы одна полоса, попадают
+в одну корзину и считаются кандидатами в похожие.
+"""
+
+import hashlib
+
+import numpy as np
+
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+PRIME = (1 << 31) - 1
+SIGNATURE_DTYPE = np.dtype("<u4")
+
+# Зерно фиксировано: при его смене индекс нужно перестроить
+# командой build_similarity_index
+_rng = np.random.default_rng(6102)
+A = _rng.integers(1, PRIME, NUM_HASHES, dtype=np.int64)
+B = _rng.integers(0, PRIME, NUM_HASHES, dtype=np.int64)
+
+
+def signature(ingredient_ids):
+    """Подпись непустого множества id ингредиентов."""
+    ids = np.asarray(list(ingredient_ids), dtype=np.int64)
+    hashes = (np.outer(A, ids) + B[:, None]) % PRIME
+    return hashes.min(axis=1).astype(SIGNATURE_DTYPE)
+
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype=SIGNATURE_DTYPE)
+
+
+def band_hashes(sig):
+    """Хэш каждой полосы подписи в виде знакового 64-битного числа."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8
+            ).digest(),
+            "little",
+            signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarities(sig, others):
+    """Оценки сходства подписи с каждой из подписей others (байты)."""
+    matrix = np.frombuffer(b"".join(others), dtype=SIGNATURE_DTYPE)
+    return (matrix.reshape(-1, NUM_HASHES) == sig).mean(axis=1)
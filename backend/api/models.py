@@ -1,9 +1,41 @@
-from django.db import models
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    Window,
+)
+from django.db.models.functions import Now, RowNumber
 from django.core.validators import MinValueValidator, MaxValueValidator
-from users.models import User
+from users.models import Subscription, User
+from api.caching import invalidate_membership
+from api import minhash
+from api.utils import CounterFieldsMixin, encode_base62
 
 MIN_AMOUNT = 1
 MAX_AMOUNT = 32000
+FEED_BATCH_SIZE = 1000
+SEARCH_BATCH_SIZE = 500
+SIMILAR_MAX_CANDIDATES = 1000
+RANKING_BATCH_SIZE = 1000
+ADJUST_BATCH_SIZE = 1000
+# Слова запроса: буквы и цифры, подчеркивание ломает синтаксис tsquery
+SEARCH_WORD_PATTERN = re.compile(r"[^\W_]+")
+SEARCH_MAX_WORDS = 10
+
+
+def normalize_search_text(text):
+    """Приводит текст к нижнему регистру, ё к е: индекс их различает."""
+    return text.lower().replace("ё", "е")
 
 
 class Ingredient(models.Model):
@@ -11,6 +43,7 @@ class Ingredient(models.Model):
 
     name = models.CharField("Название", max_length=128)
     measurement_unit = models.CharField("Единица измерения", max_length=64)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
 
     class Meta:
         verbose_name = "Ингредиент"
@@ -26,7 +59,94 @@ class Ingredient(models.Model):
         return f"{self.name}, {self.measurement_unit}"
 
 
-class Recipe(models.Model):
+class IngredientImport(models.Model):
+    """Загруженный файл ингредиентов, по контрольной сумме содержимого"""
+
+    checksum = models.CharField(
+        "Контрольная сумма", max_length=64, unique=True
+    )
+    source = models.CharField("Файл", max_length=255)
+    loaded_at = models.DateTimeField("Дата загрузки", auto_now=True)
+
+    class Meta:
+        verbose_name = "Загрузка ингредиентов"
+        verbose_name_plural = "Загрузки ингредиентов"
+
+    def __str__(self):
+        return f"{self.source} ({self.checksum[:8]})"
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Добавляет флаги избранного, корзины и подписки на автора."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef("author")
+                )
+            ),
+        )
+
+    def for_read(self, user):
+        """Запрос для чтения рецептов без дополнительных запросов на объект."""
+        return (
+            self.with_user_flags(user)
+            .select_related("author")
+            .prefetch_related("recipe_ingredients__ingredient")
+        )
+
+    def for_fragments(self):
+        """Легкий запрос для сборки ответа из кэшированных фрагментов.
+
+        Флаги зрителя берутся из множеств api.membership.
+        """
+        return self.select_related("author").only(
+            "id", "pub_date", "updated_at", "author__updated_at"
+        )
+
+    def feed(self, user, direct_ids=()):
+        """Рецепты из ленты пользователя и нескопированные рецепты
+        авторов direct_ids."""
+        condition = Q(
+            id__in=FeedEntry.objects.filter(user=user).values("recipe_id")
+        )
+        if direct_ids:
+            condition |= Q(author_id__in=direct_ids, in_feeds=False)
+        return self.filter(condition)
+
+    def latest_per_author(self, author_ids, limit):
+        """Последние limit рецептов каждого из авторов одним запросом."""
+        recipes = self.filter(author_id__in=author_ids)
+        if connection.features.supports_over_clause:
+            return recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author_id"),
+                    order_by=[F("pub_date").desc(), F("id").desc()],
+                )
+            ).filter(row_number__lte=limit)
+        # Старые версии SQLite не поддерживают оконные функции
+        latest = (
+            Recipe.objects.filter(author_id=OuterRef("author_id"))
+            .order_by("-pub_date", "-id")
+            .values("id")[:limit]
+        )
+        return recipes.filter(id__in=Subquery(latest))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецепта"""
 
     author = models.ForeignKey(
@@ -49,11 +169,38 @@ class Recipe(models.Model):
         ],
     )
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        "В избранном", default=0, editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        "В списках покупок", default=0, editable=False
+    )
+    in_feeds = models.BooleanField(
+        "Скопирован в ленты", default=False, editable=False
+    )
+
+    counter_fields = ("favorites_count", "shopping_carts_count")
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=["cooking_time", "-pub_date", "-id"],
+                name="recipe_cooking_time_idx",
+            ),
+            models.Index(
+                fields=["author", "in_feeds"],
+                name="recipe_author_in_feeds_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -96,6 +243,341 @@ class RecipeIngredient(models.Model):
         return f"{self.ingredient} в {self.recipe}"
 
 
+class RecipeSearchDocumentQuerySet(models.QuerySet):
+    """Обновление текста для поиска и поиск по нему.
+
+    Индекс зависит от базы (см. миграцию 0011_recipesearchdocument):
+    в PostgreSQL это вычисляемый столбец tsvector с индексом GIN,
+    в SQLite - таблица FTS5, которую поддерживают триггеры.
+    """
+
+    def refresh(self, recipe_ids):
+        """Пересобирает документы рецептов: название, описание, состав."""
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), SEARCH_BATCH_SIZE):
+            batch = recipe_ids[start:start + SEARCH_BATCH_SIZE]
+            names = defaultdict(list)
+            for recipe_id, name in RecipeIngredient.objects.filter(
+                recipe_id__in=batch
+            ).values_list("recipe_id", "ingredient__name"):
+                names[recipe_id].append(name)
+            self.bulk_create(
+                [
+                    self.model(
+                        recipe_id=pk,
+                        document=normalize_search_text(
+                            "\n".join([name, text, *names[pk]])
+                        ),
+                    )
+                    for pk, name, text in Recipe.objects.filter(
+                        id__in=batch
+                    ).values_list("id", "name", "text")
+                ],
+                update_conflicts=True,
+                unique_fields=["recipe"],
+                update_fields=["document"],
+            )
+
+    def search(self, query, limit):
+        """id рецептов, подходящих под запрос, от лучшего совпадения.
+
+        Каждое слово запроса должно встретиться в документе, слова
+        ищутся по префиксу.
+        """
+        words = SEARCH_WORD_PATTERN.findall(normalize_search_text(query))[
+            :SEARCH_MAX_WORDS
+        ]
+        if not words:
+            return []
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        if connection.vendor == "postgresql":
+            sql = (
+                f"SELECT recipe_id FROM {table}, "
+                "to_tsquery('russian', %s) AS query "
+                "WHERE search_vector @@ query "
+                "ORDER BY ts_rank(search_vector, query) DESC, "
+                "recipe_id DESC LIMIT %s"
+            )
+            params = [" & ".join(f"{word}:*" for word in words), limit]
+        elif connection.vendor == "sqlite":
+            fts = qn(self.model.FTS_TABLE)
+            sql = (
+                f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s "
+                f"ORDER BY bm25({fts}), rowid DESC LIMIT %s"
+            )
+            params = [" ".join(f'"{word}"*' for word in words), limit]
+        else:
+            queryset = self
+            for word in words:
+                queryset = queryset.filter(document__icontains=word)
+            return list(
+                queryset.order_by("-recipe_id").values_list(
+                    "recipe_id", flat=True
+                )[:limit]
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class RecipeSearchDocument(models.Model):
+    """Текст рецепта для полнотекстового поиска"""
+
+    FTS_TABLE = "api_recipesearchdocument_fts"
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+        verbose_name="Рецепт",
+    )
+    document = models.TextField("Текст для поиска")
+
+    objects = RecipeSearchDocumentQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Поисковый документ"
+        verbose_name_plural = "Поисковые документы"
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeSignatureQuerySet(models.QuerySet):
+    """Подписи MinHash и корзины LSH для поиска похожих рецептов."""
+
+    @transaction.atomic
+    def refresh(self, recipe_ids):
+        """Пересчитывает подписи и корзины рецептов по их составу."""
+        recipe_ids = list(recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("recipe_id", "ingredient_id"):
+            ingredients[recipe_id].append(ingredient_id)
+        signatures = {
+            pk: minhash.signature(ingredients[pk])
+            for pk in Recipe.objects.filter(id__in=recipe_ids).values_list(
+                "id", flat=True
+            )
+            if ingredients[pk]
+        }
+        self.filter(recipe_id__in=recipe_ids).exclude(
+            recipe_id__in=signatures
+        ).delete()
+        self.bulk_create(
+            [
+                self.model(recipe_id=pk, signature=sig.tobytes())
+                for pk, sig in signatures.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["recipe"],
+            update_fields=["signature"],
+        )
+        RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeBucket.objects.bulk_create(
+            RecipeBucket(recipe_id=pk, band=band, bucket=bucket)
+            for pk, sig in signatures.items()
+            for band, bucket in enumerate(minhash.band_hashes(sig))
+        )
+
+    def similar(self, recipe, limit):
+        """Похожие рецепты: список (id рецепта, оценка сходства).
+
+        Кандидаты - рецепты из тех же корзин, сначала те, с кем общих
+        корзин больше. Их подписи сравниваются с подписью рецепта.
+        """
+        stored = self.filter(recipe=recipe).values_list(
+            "signature", flat=True
+        ).first()
+        if stored is not None:
+            sig = minhash.from_bytes(stored)
+        else:
+            ingredient_ids = list(
+                recipe.recipe_ingredients.values_list(
+                    "ingredient_id", flat=True
+                )
+            )
+            if not ingredient_ids:
+                return []
+            sig = minhash.signature(ingredient_ids)
+        buckets = Q()
+        for band, bucket in enumerate(minhash.band_hashes(sig)):
+            buckets |= Q(band=band, bucket=bucket)
+        candidates = list(
+            RecipeBucket.objects.filter(buckets)
+            .exclude(recipe=recipe)
+            .values("recipe_id")
+            .annotate(shared=Count("pk"))
+            .order_by("-shared", "-recipe_id")
+            .values_list("recipe_id", flat=True)[:SIMILAR_MAX_CANDIDATES]
+        )
+        if not candidates:
+            return []
+        rows = list(
+            self.filter(recipe_id__in=candidates).values_list(
+                "recipe_id", "signature"
+            )
+        )
+        recipe_ids = [recipe_id for recipe_id, _ in rows]
+        scores = minhash.similarities(sig, [data for _, data in rows])
+        ranked = sorted(
+            zip(recipe_ids, scores.tolist()),
+            key=lambda item: (-item[1], -item[0]),
+        )
+        return ranked[:limit]
+
+
+class RecipeSignature(models.Model):
+    """Подпись MinHash состава рецепта"""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="signature",
+        verbose_name="Рецепт",
+    )
+    signature = models.BinaryField("Подпись")
+
+    objects = RecipeSignatureQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Подпись рецепта"
+        verbose_name_plural = "Подписи рецептов"
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH, в которую попала полоса подписи рецепта"""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="lsh_buckets",
+        verbose_name="Рецепт",
+    )
+    band = models.PositiveSmallIntegerField("Полоса")
+    bucket = models.BigIntegerField("Хэш полосы")
+
+    class Meta:
+        verbose_name = "Корзина LSH"
+        verbose_name_plural = "Корзины LSH"
+        indexes = [
+            models.Index(
+                fields=["band", "bucket"], name="recipe_bucket_band_idx"
+            )
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "band"], name="unique_recipe_band"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.band}"
+
+
+class UserRecipeQuerySet(models.QuerySet):
+    """Добавление и удаление рецептов пользователя одним запросом.
+
+    Повторное добавление и удаление отсутствующего рецепта не ошибка:
+    методы возвращают id рецептов, которые действительно изменились.
+    Счетчик рецепта counter_field меняется в той же транзакции.
+    """
+
+    counter_field = None
+    membership_kind = None
+
+    @transaction.atomic
+    def add(self, user, recipe_ids):
+        added = self.insert(user, recipe_ids)
+        self.update_counter(added, 1)
+        if added:
+            invalidate_membership(user.pk, self.membership_kind)
+        return added
+
+    @transaction.atomic
+    def remove(self, user, recipe_ids):
+        removed = self.delete_returning(user, recipe_ids)
+        self.update_counter(removed, -1)
+        if removed:
+            invalidate_membership(user.pk, self.membership_kind)
+        return removed
+
+    def update_counter(self, recipe_ids, delta):
+        if recipe_ids:
+            Recipe.objects.filter(id__in=recipe_ids).update(
+                **{self.counter_field: F(self.counter_field) + delta}
+            )
+
+    def insert(self, user, recipe_ids):
+        if not recipe_ids:
+            return []
+        meta = self.model._meta
+        qn = connection.ops.quote_name
+        user_column = qn(meta.get_field("user").column)
+        recipe_column = qn(meta.get_field("recipe").column)
+        placeholders = ", ".join(["%s"] * len(recipe_ids))
+        # Несуществующие рецепты отбрасывает SELECT, дубликаты - ON CONFLICT
+        sql = (
+            f"INSERT INTO {qn(meta.db_table)} "
+            f"({user_column}, {recipe_column}) "
+            f"SELECT %s, {qn('id')} FROM {qn(Recipe._meta.db_table)} "
+            f"WHERE {qn('id')} IN ({placeholders}) "
+            f"ON CONFLICT ({user_column}, {recipe_column}) DO NOTHING "
+            f"RETURNING {recipe_column}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.id, *recipe_ids])
+            return [row[0] for row in cursor.fetchall()]
+
+    def delete_returning(self, user, recipe_ids):
+        if not recipe_ids:
+            return []
+        meta = self.model._meta
+        qn = connection.ops.quote_name
+        recipe_column = qn(meta.get_field("recipe").column)
+        placeholders = ", ".join(["%s"] * len(recipe_ids))
+        sql = (
+            f"DELETE FROM {qn(meta.db_table)} "
+            f"WHERE {qn(meta.get_field('user').column)} = %s "
+            f"AND {recipe_column} IN ({placeholders}) "
+            f"RETURNING {recipe_column}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.id, *recipe_ids])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FavoriteQuerySet(UserRecipeQuerySet):
+    counter_field = "favorites_count"
+    membership_kind = "favorites"
+
+
+class ShoppingCartQuerySet(UserRecipeQuerySet):
+    """Вместе с корзиной обновляет суммы в списке покупок."""
+
+    counter_field = "shopping_carts_count"
+    membership_kind = "cart"
+
+    @transaction.atomic
+    def add(self, user, recipe_ids):
+        added = super().add(user, recipe_ids)
+        ShoppingListItem.objects.add_recipes(user, added)
+        return added
+
+    @transaction.atomic
+    def remove(self, user, recipe_ids):
+        removed = super().remove(user, recipe_ids)
+        ShoppingListItem.objects.add_recipes(user, removed, sign=-1)
+        return removed
+
+
 class Favorite(models.Model):
     """Модель избранных рецептов"""
 
@@ -111,6 +593,13 @@ class Favorite(models.Model):
         related_name="favorites",
         verbose_name="Рецепт",
     )
+    # Заполняет база: строки вставляются и сырым SQL (UserRecipeQuerySet).
+    # У строк, добавленных до появления поля, даты нет
+    created_at = models.DateTimeField(
+        "Дата добавления", null=True, db_default=Now(), editable=False
+    )
+
+    objects = FavoriteQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Избранное"
@@ -120,6 +609,9 @@ class Favorite(models.Model):
                 fields=["user", "recipe"], name="unique_favorite"
             )
         ]
+        indexes = [
+            models.Index(fields=["created_at"], name="favorite_created_at_idx")
+        ]
 
     def __str__(self):
         return f"{self.user} -> {self.recipe}"
@@ -140,6 +632,13 @@ class ShoppingCart(models.Model):
         related_name="shopping_carts",
         verbose_name="Рецепт",
     )
+    # Заполняет база: строки вставляются и сырым SQL (UserRecipeQuerySet).
+    # У строк, добавленных до появления поля, даты нет
+    created_at = models.DateTimeField(
+        "Дата добавления", null=True, db_default=Now(), editable=False
+    )
+
+    objects = ShoppingCartQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Список покупок"
@@ -149,6 +648,401 @@ class ShoppingCart(models.Model):
                 fields=["user", "recipe"], name="unique_shopping_cart"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["created_at"], name="shopping_cart_created_at_idx"
+            )
+        ]
 
     def __str__(self):
         return f"{self.user} -> {self.recipe}"
+
+
+class RecipeRankingQuerySet(models.QuerySet):
+    """Таблицы лидеров, пересчитываемые командой compute_rankings."""
+
+    @transaction.atomic
+    def replace(self, rows):
+        """Записывает рейтинги всех рецептов.
+
+        rows - (id рецепта, популярность, тренд); рейтинги удаленных
+        рецептов удаляются каскадно.
+        """
+        rows = list(rows)
+        popular_ranks = rank_scores(
+            (recipe_id, popular) for recipe_id, popular, _ in rows
+        )
+        trending_ranks = rank_scores(
+            (recipe_id, trending) for recipe_id, _, trending in rows
+        )
+        self.bulk_create(
+            [
+                self.model(
+                    recipe_id=recipe_id,
+                    popular_score=popular,
+                    popular_rank=popular_ranks.get(recipe_id),
+                    trending_score=trending,
+                    trending_rank=trending_ranks.get(recipe_id),
+                )
+                for recipe_id, popular, trending in rows
+            ],
+            batch_size=RANKING_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["recipe"],
+            update_fields=[
+                "popular_score",
+                "popular_rank",
+                "trending_score",
+                "trending_rank",
+                "computed_at",
+            ],
+        )
+
+
+def rank_scores(scores):
+    """Места по убыванию оценки, при равенстве новее выше.
+
+    Рецепты с нулевой оценкой места не получают.
+    """
+    ordered = sorted(
+        ((score, recipe_id) for recipe_id, score in scores if score > 0),
+        reverse=True,
+    )
+    return {
+        recipe_id: rank for rank, (_, recipe_id) in enumerate(ordered, 1)
+    }
+
+
+class RecipeRanking(models.Model):
+    """Место рецепта в таблицах лидеров"""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ranking",
+        verbose_name="Рецепт",
+    )
+    popular_score = models.PositiveIntegerField("Популярность", default=0)
+    popular_rank = models.PositiveIntegerField(
+        "Место по популярности", null=True
+    )
+    trending_score = models.FloatField("Оценка тренда", default=0)
+    trending_rank = models.PositiveIntegerField(
+        "Место в трендах", null=True
+    )
+    computed_at = models.DateTimeField("Дата расчета", auto_now=True)
+
+    objects = RecipeRankingQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Рейтинг рецепта"
+        verbose_name_plural = "Рейтинги рецептов"
+        indexes = [
+            models.Index(
+                fields=["popular_rank"], name="ranking_popular_rank_idx"
+            ),
+            models.Index(
+                fields=["trending_rank"], name="ranking_trending_rank_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.popular_rank}"
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    @transaction.atomic
+    def adjust(self, deltas):
+        """Изменяет суммы по словарю {(user_id, ingredient_id): delta}.
+
+        Прибавление делается через INSERT ... ON CONFLICT DO UPDATE,
+        поэтому одновременные добавления одной позиции не конфликтуют.
+        Вычитание меняет только существующие строки, не опускаясь ниже
+        нуля, а опустевшие позиции удаляются.
+        """
+        deltas = sorted(
+            (key, delta) for key, delta in deltas.items() if delta
+        )
+        added = [(*key, delta) for key, delta in deltas if delta > 0]
+        removed = [(*key, -delta) for key, delta in deltas if delta < 0]
+        for start in range(0, len(added), ADJUST_BATCH_SIZE):
+            self.upsert(added[start:start + ADJUST_BATCH_SIZE])
+        emptied = []
+        for start in range(0, len(removed), ADJUST_BATCH_SIZE):
+            emptied += self.subtract(removed[start:start + ADJUST_BATCH_SIZE])
+        if emptied:
+            self.filter(pk__in=emptied, total_amount=0).delete()
+
+    def columns(self):
+        meta = self.model._meta
+        qn = connection.ops.quote_name
+        return (
+            qn(meta.db_table),
+            qn(meta.get_field("user").column),
+            qn(meta.get_field("ingredient").column),
+            qn(meta.get_field("total_amount").column),
+        )
+
+    def upsert(self, rows):
+        table, user, ingredient, total = self.columns()
+        values = ", ".join(["(%s, %s, %s)"] * len(rows))
+        sql = (
+            f"INSERT INTO {table} ({user}, {ingredient}, {total}) "
+            f"VALUES {values} "
+            f"ON CONFLICT ({user}, {ingredient}) "
+            f"DO UPDATE SET {total} = {table}.{total} + EXCLUDED.{total}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+
+    def subtract(self, rows):
+        """Уменьшает суммы, возвращает id позиций, ставших нулевыми."""
+        table, user, ingredient, total = self.columns()
+        qn = connection.ops.quote_name
+        values = ", ".join(["(%s, %s, %s)"] * len(rows))
+        sql = (
+            "WITH changes (user_id, ingredient_id, amount) "
+            f"AS (VALUES {values}) "
+            f"UPDATE {table} SET {total} = CASE "
+            f"WHEN {table}.{total} > changes.amount "
+            f"THEN {table}.{total} - changes.amount ELSE 0 END "
+            "FROM changes "
+            f"WHERE {table}.{user} = changes.user_id "
+            f"AND {table}.{ingredient} = changes.ingredient_id "
+            f"RETURNING {table}.{qn('id')}, {table}.{total}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+            return [pk for pk, amount in cursor.fetchall() if amount <= 0]
+
+    def add_recipes(self, user, recipe_ids, sign=1):
+        """Добавляет (или вычитает при sign=-1) ингредиенты рецептов."""
+        if not recipe_ids:
+            return
+        amounts = (
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values_list("ingredient_id")
+            .annotate(amount=Sum("amount"))
+            .order_by()
+        )
+        self.adjust(
+            {
+                (user.id, ingredient_id): sign * amount
+                for ingredient_id, amount in amounts
+            }
+        )
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Пересчитывает списки всех пользователей с рецептом в корзине."""
+        changes = {
+            ingredient_id: new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        user_ids = ShoppingCart.objects.filter(recipe=recipe).values_list(
+            "user_id", flat=True
+        )
+        self.adjust(
+            {
+                (user_id, ingredient_id): delta
+                for user_id in user_ids
+                for ingredient_id, delta in changes.items()
+            }
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента в списке покупок пользователя.
+
+    Поддерживается при изменении корзины и ингредиентов рецептов,
+    чтобы выгрузка списка не пересчитывала его по рецептам.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.PositiveIntegerField("Количество")
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Позиции списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"], name="unique_shopping_list_item"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.ingredient} - {self.total_amount}"
+
+
+class ShortLinkQuerySet(models.QuerySet):
+    def for_recipe(self, recipe):
+        """Короткая ссылка рецепта, создается при первом обращении."""
+        link, _ = self.get_or_create(
+            recipe=recipe, defaults={"code": encode_base62(recipe.pk)}
+        )
+        return link
+
+
+class ShortLink(models.Model):
+    """Короткая ссылка на рецепт.
+
+    Код - это id рецепта в base62, поэтому коды не повторяются.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="short_link",
+        verbose_name="Рецепт",
+    )
+    code = models.CharField("Код", max_length=16, unique=True)
+
+    objects = ShortLinkQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Короткая ссылка"
+        verbose_name_plural = "Короткие ссылки"
+
+    def __str__(self):
+        return f"{self.code} -> {self.recipe_id}"
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    """Ленты подписок, которые заполняются при публикации рецепта.
+
+    Рецепты авторов, у которых больше FEED_FANOUT_LIMIT подписчиков,
+    в ленты не копируются и читаются напрямую (см. RecipeQuerySet.feed).
+    Скопирован ли рецепт, решается один раз при публикации и хранится
+    в Recipe.in_feeds, поэтому смена числа подписчиков автора не
+    теряет ранее опубликованные рецепты.
+    """
+
+    def is_popular(self, author):
+        # Счетчик читаем из базы: объект автора может быть из кэша
+        return User.objects.filter(
+            pk=author.pk, followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).exists()
+
+    def direct_authors(self, user):
+        """id авторов из подписок пользователя с рецептами не из ленты."""
+        return list(
+            Subscription.objects.filter(user=user)
+            .filter(
+                Exists(
+                    Recipe.objects.filter(
+                        author_id=OuterRef("author_id"), in_feeds=False
+                    )
+                )
+            )
+            .values_list("author_id", flat=True)
+        )
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты подписчиков автора."""
+        if self.is_popular(recipe.author):
+            return
+        follower_ids = Subscription.objects.filter(
+            author=recipe.author
+        ).values_list("user_id", flat=True)
+        self.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id,
+                    recipe=recipe,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date,
+                )
+                for user_id in follower_ids.iterator()
+            ),
+            batch_size=FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(in_feeds=True)
+
+    def backfill(self, user, author):
+        """Добавляет в ленту скопированные рецепты автора после подписки.
+
+        Остальные рецепты автора лента читает напрямую.
+        """
+        recipes = author.recipes.filter(in_feeds=True).values_list(
+            "id", "pub_date"
+        )
+        self.bulk_create(
+            (
+                FeedEntry(
+                    user=user,
+                    recipe_id=recipe_id,
+                    author=author,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in recipes.iterator()
+            ),
+            batch_size=FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def prune(self, user, author):
+        """Убирает из ленты рецепты автора после отписки."""
+        self.filter(user=user, author=author).delete()
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Пользователь",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-id"],
+                name="feed_user_pub_date_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="feed_user_author_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_entry"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.recipe}"
@@ -1,13 +1,85 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.db import connection
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 
+def estimate_count(queryset):
+    """Оценка количества строк по статистике планировщика PostgreSQL."""
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class KeysetPagination(CursorPagination):
+    """Постраничный вывод по ключу сортировки, без OFFSET и COUNT(*).
+
+    Порядок задает атрибут cursor_ordering представления. Поле count
+    по умолчанию приблизительное, ?count=exact считает точно,
+    ?count=none не считает вовсе.
+    """
+
+    page_size = 6
+    page_size_query_param = "limit"
+    max_page_size = 100
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = getattr(view, "cursor_ordering", ("-id",))
+        self.queryset = queryset
+        self.count_mode = request.query_params.get(self.count_query_param)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self):
+        if self.count_mode == "none":
+            return None
+        if self.count_mode == "exact":
+            return self.queryset.count()
+        return estimate_count(self.queryset)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.get_count(),
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+
 class CustomPagination(PageNumberPagination):
+    """Постраничный вывод по номеру страницы или, с ?cursor=, по ключу.
+
+    Если cursor_ordering представления равен None, порядок не имеет
+    ключа и ?cursor= не учитывается.
+    """
+
     page_size = 6
     page_size_query_param = "limit"
     max_page_size = 100
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (
+            self.cursor_query_param in request.query_params
+            and getattr(view, "cursor_ordering", ("-id",)) is not None
+        ):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
         return Response(
             {
                 "count": self.page.paginator.count,
@@ -18,6 +90,14 @@ class CustomPagination(PageNumberPagination):
         )
 
 
+class ListPagination(PageNumberPagination):
+    """Постраничный вывод готового списка, например ранжированного."""
+
+    page_size = 6
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
 class EmptyResultsPagination(PageNumberPagination):
     page_size = 6  # или нужное вам значение
     page_size_query_param = "limit"
@@ -0,0 +1,200 @@
+import threading
+import uuid
+
+import numpy as np
+
+from api.caching import versions
+from api.models import Ingredient, RecipeIngredient
+
+PANTRY_VERSION_KEY = "recipes:pantry:version"
+PANTRY_CHANGES_KEY = "recipes:pantry:changes"
+PANTRY_CHANGE_KEY = "recipes:pantry:change:{}"
+# Записи журнала живут сутки; процесс, который отстал сильнее или
+# не нашел запись, перестраивает матрицу целиком
+PANTRY_CHANGE_TIMEOUT = 86400
+MAX_PANTRY_CHANGES = 1000
+WORD_BITS = 64
+
+
+def bits(columns):
+    """Бит каждого столбца внутри его слова."""
+    return np.left_shift(
+        np.uint64(1), (columns % WORD_BITS).astype(np.uint64)
+    )
+
+
+class PantryIndex:
+    """Составы рецептов в виде битовых масок для подбора по запасам.
+
+    Строка матрицы - рецепт, бит - ингредиент справочника, маска
+    хранится словами uint64. Совпадения с запасами пользователя
+    считаются побитовым И и подсчетом единиц сразу по всем рецептам.
+
+    Матрица строится целиком, только когда меняется версия в общем кэше
+    (при изменении справочника, см. invalidate). Измененные рецепты
+    записываются в журнал в том же кэше (см. changed), и каждый процесс
+    перечитывает из базы только их строки.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.seq = None
+        self.ingredient_ids = np.empty(0, dtype=np.int64)
+        self.recipe_ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, 0), dtype=np.uint64)
+        self.totals = np.empty(0, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    def ensure_fresh(self):
+        version = versions.get_or_set(
+            PANTRY_VERSION_KEY, uuid.uuid4().hex, None
+        )
+        seq = versions.get_or_set(PANTRY_CHANGES_KEY, 0, None)
+        if version == self.version and seq == self.seq:
+            return
+        with self.lock:
+            if version == self.version and seq == self.seq:
+                return
+            if (
+                version != self.version
+                or not 0 < seq - self.seq <= MAX_PANTRY_CHANGES
+                or not self.apply_changes(self.seq, seq)
+            ):
+                self.build()
+            self.version = version
+            self.seq = seq
+
+    def apply_changes(self, start, end):
+        """Обновляет строки рецептов из журнала, False - журнал неполон."""
+        keys = [PANTRY_CHANGE_KEY.format(n) for n in range(start + 1, end + 1)]
+        found = versions.get_many(keys)
+        if len(found) < len(keys):
+            return False
+        return self.update(set(found.values()))
+
+    def update(self, recipe_ids):
+        """Перечитывает строки рецептов; False - нужна полная сборка."""
+        changed = np.array(sorted(recipe_ids), dtype=np.int64)
+        pairs = np.fromiter(
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values_list("recipe_id", "ingredient_id")
+            .iterator(),
+            dtype=np.dtype((np.int64, 2)),
+        ).reshape(-1, 2)
+        columns = np.searchsorted(self.ingredient_ids, pairs[:, 1])
+        if len(columns) and (
+            columns.max() >= len(self.ingredient_ids)
+            or (self.ingredient_ids[columns] != pairs[:, 1]).any()
+        ):
+            return False
+
+        # Новые рецепты дописываются в конец, порядок id сохраняется
+        new_ids = np.setdiff1d(changed, self.recipe_ids)
+        if len(new_ids):
+            if len(self.recipe_ids) and new_ids[0] < self.recipe_ids[-1]:
+                return False
+            self.recipe_ids = np.concatenate([self.recipe_ids, new_ids])
+            self.matrix = np.vstack(
+                [
+                    self.matrix,
+                    np.zeros(
+                        (len(new_ids), self.matrix.shape[1]), dtype=np.uint64
+                    ),
+                ]
+            )
+            self.totals = np.concatenate(
+                [self.totals, np.zeros(len(new_ids), dtype=np.int64)]
+            )
+
+        # Строки удаленных рецептов остаются пустыми до полной сборки
+        rows = np.searchsorted(self.recipe_ids, changed)
+        self.matrix[rows] = 0
+        np.bitwise_or.at(
+            self.matrix,
+            (
+                np.searchsorted(self.recipe_ids, pairs[:, 0]),
+                columns // WORD_BITS,
+            ),
+            bits(columns),
+        )
+        self.totals[rows] = np.bitwise_count(self.matrix[rows]).sum(
+            axis=1, dtype=np.int64
+        )
+        return True
+
+    def build(self):
+        ingredient_ids = np.fromiter(
+            Ingredient.objects.order_by("id").values_list("id", flat=True),
+            dtype=np.int64,
+        )
+        pairs = np.fromiter(
+            RecipeIngredient.objects.values_list(
+                "recipe_id", "ingredient_id"
+            ).iterator(),
+            dtype=np.dtype((np.int64, 2)),
+        ).reshape(-1, 2)
+        recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        columns = np.searchsorted(ingredient_ids, pairs[:, 1])
+        words = -(-len(ingredient_ids) // WORD_BITS)
+        matrix = np.zeros((len(recipe_ids), words), dtype=np.uint64)
+        np.bitwise_or.at(matrix, (rows, columns // WORD_BITS), bits(columns))
+        self.ingredient_ids = ingredient_ids
+        self.recipe_ids = recipe_ids
+        self.matrix = matrix
+        self.totals = np.bitwise_count(matrix).sum(axis=1, dtype=np.int64)
+
+    def rank(self, pantry_ids, max_missing=None):
+        """Рецепты с ингредиентами из запасов, сначала самые полные.
+
+        Возвращает список (id рецепта, есть в запасах, не хватает),
+        упорядоченный по нехватке, затем по совпадениям и новизне.
+        """
+        self.ensure_fresh()
+        pantry_ids = np.unique(np.asarray(pantry_ids, dtype=np.int64))
+        columns = np.searchsorted(self.ingredient_ids, pantry_ids)
+        known = columns < len(self.ingredient_ids)
+        known[known] = (
+            self.ingredient_ids[columns[known]] == pantry_ids[known]
+        )
+        columns = columns[known]
+        if not len(columns) or not len(self.recipe_ids):
+            return []
+
+        # Считаем только слова, в которые попали ингредиенты из запасов
+        words, positions = np.unique(columns // WORD_BITS, return_inverse=True)
+        mask = np.zeros(len(words), dtype=np.uint64)
+        np.bitwise_or.at(mask, positions, bits(columns))
+        matched = np.bitwise_count(self.matrix[:, words] & mask).sum(
+            axis=1, dtype=np.int64
+        )
+        missing = self.totals - matched
+        selected = matched > 0
+        if max_missing is not None:
+            selected &= missing <= max_missing
+        recipe_ids = self.recipe_ids[selected]
+        matched = matched[selected]
+        missing = missing[selected]
+        order = np.lexsort((-recipe_ids, -matched, missing))
+        return list(
+            zip(
+                recipe_ids[order].tolist(),
+                matched[order].tolist(),
+                missing[order].tolist(),
+            )
+        )
+
+    def invalidate(self):
+        """Перестраивает матрицу во всех процессах."""
+        versions.set(PANTRY_VERSION_KEY, uuid.uuid4().hex, None)
+        self.version = None
+
+    def changed(self, recipe_id):
+        """Записывает рецепт в журнал изменений для всех процессов."""
+        versions.get_or_set(PANTRY_CHANGES_KEY, 0, None)
+        seq = versions.incr(PANTRY_CHANGES_KEY)
+        versions.set(
+            PANTRY_CHANGE_KEY.format(seq), recipe_id, PANTRY_CHANGE_TIMEOUT
+        )
+
+
+pantry = PantryIndex()
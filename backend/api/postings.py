@@ -0,0 +1,74 @@
+"""Обратный индекс: ингредиент -> отсортированные id рецептов.
+
+Списки лежат в кэше и сбрасываются при изменении состава рецептов
+(см. invalidate_postings), поэтому фильтр по нескольким ингредиентам
+сводится к пересечению или объединению массивов, без GROUP BY по всей
+таблице связей.
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.caching import POSTING_KEY
+from api.membership import Membership
+from api.models import RecipeIngredient
+
+
+def load_postings(ingredient_ids):
+    """Списки рецептов ингредиентов: одно чтение кэша, промахи из базы."""
+    keys = {pk: POSTING_KEY.format(pk) for pk in ingredient_ids}
+    cached = cache.get_many(keys.values())
+    postings = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in keys if pk not in postings]
+    if missing:
+        loaded = defaultdict(list)
+        for ingredient_id, recipe_id in RecipeIngredient.objects.filter(
+            ingredient_id__in=missing
+        ).values_list("ingredient_id", "recipe_id"):
+            loaded[ingredient_id].append(recipe_id)
+        fresh = {pk: Membership(loaded[pk]) for pk in missing}
+        cache.set_many(
+            {keys[pk]: posting for pk, posting in fresh.items()},
+            settings.POSTING_CACHE_TIMEOUT,
+        )
+        postings.update(fresh)
+    return [postings[pk] for pk in keys]
+
+
+def intersect(postings):
+    """id, которые есть во всех списках.
+
+    Идем от самого короткого списка и ищем его id в остальных
+    двоичным поиском, не возвращаясь к уже пройденной части.
+    """
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+    result = list(postings[0])
+    for posting in postings[1:]:
+        ids = posting.ids
+        kept = []
+        low = 0
+        for value in result:
+            low = bisect_left(ids, value, low)
+            if low == len(ids):
+                break
+            if ids[low] == value:
+                kept.append(value)
+        result = kept
+        if not result:
+            break
+    return result
+
+
+def union(postings):
+    """id, которые есть хотя бы в одном списке, по возрастанию."""
+    result = []
+    for value in heapq.merge(*postings):
+        if not result or result[-1] != value:
+            result.append(value)
+    return result
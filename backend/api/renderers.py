@@ -0,0 +1,65 @@
+import csv
+
+import pdfkit
+from django.template.loader import render_to_string
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Рендерер выгрузки списка покупок.
+
+    Сам список отдается потоком из представления, через рендерер
+    проходят только ошибки. Их тело отдается в JSON, как в остальном
+    API, независимо от выбранного формата выгрузки.
+    """
+
+    charset = "utf-8"
+    filename = "shopping_list"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+class Echo:
+    """Буфер, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(rows):
+    for name, measurement_unit, total_amount in rows:
+        yield f"{name} - {total_amount} {measurement_unit}\n"
+
+
+def shopping_list_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(["Ингредиент", "Количество", "Единица измерения"])
+    for name, measurement_unit, total_amount in rows:
+        yield writer.writerow([name, total_amount, measurement_unit])
+
+
+def shopping_list_pdf(rows):
+    html = render_to_string("shopping_list.html", {"rows": rows})
+    return pdfkit.from_string(html, False)
@@ -8,14 +8,37 @@ from .models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
+    RecipeSignature,
     ShoppingCart,
+    ShoppingListItem,
 )
 from users.models import Subscription, User
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from api.caching import (
+    fragment_variant,
+    invalidate_postings,
+    recipe_fragment_key,
+)
+from api.membership import get_membership
 from api.utils import Base64ImageField
 
 MIN_VALUE = 1
 MAX_VALUE = 32000
+RECIPES_LIMIT = 3
+MAX_BULK_RECIPES = 100
+MAX_PANTRY_INGREDIENTS = 500
+
+
+def get_recipes_limit(request):
+    """Количество рецептов автора из параметра recipes_limit."""
+    try:
+        return int(request.GET.get("recipes_limit", RECIPES_LIMIT))
+    except (TypeError, ValueError):
+        return RECIPES_LIMIT
 
 
 class CustomTokenCreateSerializer(serializers.Serializer):
@@ -64,10 +87,11 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {"password": {"write_only": True}}
 
     def get_is_subscribed(self, obj):
-        request = self.context["request"]
-        if request and not request.user.is_anonymous:
-            return obj.subscribing.filter(user=request.user).exists()
-        return False
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+        return obj.pk in get_membership(
+            self.context.get("request"), "follows"
+        )
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -105,10 +129,11 @@ class UserSimpleSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context["request"]
-        if request and not request.user.is_anonymous:
-            return obj.subscribing.filter(user=request.user).exists()
-        return False
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+        return obj.pk in get_membership(
+            self.context.get("request"), "follows"
+        )
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -164,19 +189,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return True
 
     def get_recipes(self, obj):
-        request = self.context["request"]
-        try:
-            limit = int(request.query_params.get("recipes_limit", 3))
-        except (TypeError, ValueError):
-            limit = 3
-
-        recipes = obj.author.recipes.all()[:limit]
+        recipes_by_author = self.context.get("recipes_by_author")
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.author_id, [])
+        else:
+            limit = get_recipes_limit(self.context["request"])
+            recipes = obj.author.recipes.all()[:limit]
         return RecipeShortSerializer(
             recipes, many=True, context=self.context
         ).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -202,6 +226,54 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+    )
+
+    def validate_recipes(self, value):
+        recipe_ids = list(dict.fromkeys(value))
+        existing_ids = set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                "id", flat=True
+            )
+        )
+        missing_ids = set(recipe_ids) - existing_ids
+        if missing_ids:
+            raise serializers.ValidationError(
+                f"Рецепты с id={missing_ids} не существуют."
+            )
+        return recipe_ids
+
+
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по запасам: ?ingredients=1,2,3."""
+
+    ingredients = serializers.CharField()
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_ingredients(self, value):
+        try:
+            ingredient_ids = [
+                int(pk) for pk in value.split(",") if pk.strip()
+            ]
+        except ValueError:
+            raise serializers.ValidationError(
+                "Ожидается список id ингредиентов через запятую"
+            )
+        if not ingredient_ids:
+            raise serializers.ValidationError(
+                "Нужен хотя бы один ингредиент"
+            )
+        if len(ingredient_ids) > MAX_PANTRY_INGREDIENTS:
+            raise serializers.ValidationError(
+                f"Не больше {MAX_PANTRY_INGREDIENTS} ингредиентов"
+            )
+        return ingredient_ids
+
+
 class RecipeShortSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
 
@@ -210,7 +282,32 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "image", "cooking_time")
 
 
+class SimilarRecipeSerializer(RecipeShortSerializer):
+    """Похожий рецепт с оценкой сходства составов."""
+
+    similarity = serializers.SerializerMethodField()
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + ("similarity",)
+
+    def get_similarity(self, obj):
+        return round(self.context["similarities"][obj.pk], 3)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if hasattr(data, "all") else data
+        return self.child.represent_many(list(recipes))
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
+    """Рецепт для чтения, собранный из кэшированного фрагмента.
+
+    Фрагмент содержит все, кроме флагов зрителя: их значения берутся
+    из аннотаций with_user_flags или множеств пользователя
+    (api.membership) и подставляются при каждом запросе.
+    """
+
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         many=True, source="recipe_ingredients"
@@ -232,18 +329,84 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "text",
             "cooking_time",
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, recipes):
+        variant = fragment_variant(self.context.get("request"))
+        keys = [recipe_fragment_key(recipe, variant) for recipe in recipes]
+        fragments = cache.get_many(keys)
+        missing = [
+            recipe
+            for recipe, key in zip(recipes, keys)
+            if key not in fragments
+        ]
+        if missing:
+            loaded = self.load_full(missing)
+            created = {
+                key: self.serialize_fragment(loaded[recipe.pk])
+                for recipe, key in zip(recipes, keys)
+                if key not in fragments and recipe.pk in loaded
+            }
+            cache.set_many(created, settings.FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(created)
+        return [
+            self.overlay_flags(fragments[key], recipe)
+            for recipe, key in zip(recipes, keys)
+            if key in fragments
+        ]
+
+    def load_full(self, recipes):
+        """Рецепты со всеми данными для фрагмента, по id."""
+        if all(
+            "recipe_ingredients" in getattr(
+                recipe, "_prefetched_objects_cache", {}
+            )
+            for recipe in recipes
+        ):
+            return {recipe.pk: recipe for recipe in recipes}
+        request = self.context.get("request")
+        user = request.user if request is not None else AnonymousUser()
+        return Recipe.objects.for_read(user).in_bulk(
+            [recipe.pk for recipe in recipes]
+        )
+
+    def serialize_fragment(self, recipe):
+        # Флаг подписки посчитан в запросе рецептов, передаем его автору
+        if hasattr(recipe, "author_is_subscribed"):
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        return super().to_representation(recipe)
+
+    def overlay_flags(self, fragment, recipe):
+        data = dict(fragment)
+        data["author"] = dict(fragment["author"])
+        data["author"]["is_subscribed"] = self.get_author_is_subscribed(
+            recipe
+        )
+        data["is_favorited"] = self.get_is_favorited(recipe)
+        data["is_in_shopping_cart"] = self.get_is_in_shopping_cart(recipe)
+        return data
+
+    def get_author_is_subscribed(self, obj):
+        if hasattr(obj, "author_is_subscribed"):
+            return obj.author_is_subscribed
+        return UserSerializer(context=self.context).get_is_subscribed(
+            obj.author
+        )
 
     def get_is_favorited(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return user.favorite.filter(recipe=obj).exists()
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
+        return obj.pk in get_membership(
+            self.context.get("request"), "favorites"
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return user.shopping_cart.filter(recipe=obj).exists()
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
+        return obj.pk in get_membership(self.context.get("request"), "cart")
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -269,12 +432,16 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
-        image = data.get("image")
-        if image is None or image == "":
-            raise serializers.ValidationError(
-                {"image": "Это поле обязательно."}
-            )
+        # При частичном обновлении поля можно не передавать
+        if not self.partial or "image" in data:
+            image = data.get("image")
+            if image is None or image == "":
+                raise serializers.ValidationError(
+                    {"image": "Это поле обязательно."}
+                )
 
+        if self.partial and "ingredients" not in data:
+            return data
         ingredients = data.get("ingredients")
         if not ingredients:
             raise serializers.ValidationError(
@@ -289,6 +456,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     def create_recipe_ingredients(self, recipe, ingredients_data):
         """Создает связь рецепта с ингредиентами через bulk_create."""
+        if not ingredients_data:
+            return
         recipe_ingredients = []
         ingredient_ids = [ingredient["id"] for ingredient in ingredients_data]
 
@@ -319,21 +488,61 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
 
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        # bulk_create не отправляет сигналы, сбрасываем индекс сами
+        invalidate_postings(ingredient_ids)
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop("ingredients")
         recipe = Recipe.objects.create(**validated_data)
         self.create_recipe_ingredients(recipe, ingredients_data)
+        RecipeSignature.objects.refresh([recipe.pk])
         return recipe
 
-    def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop("ingredients")
-        instance = super().update(instance, validated_data)
+    def update_recipe_ingredients(self, recipe, ingredients_data):
+        """Применяет к рецепту только изменившиеся ингредиенты."""
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        new_amounts = {item["id"]: item["amount"] for item in ingredients_data}
+        if new_amounts == old_amounts:
+            return
 
-        # Удаляем старые ингредиенты и создаем новые
-        instance.recipe_ingredients.all().delete()
-        self.create_recipe_ingredients(instance, ingredients_data)
+        removed = [
+            current[ingredient_id].pk
+            for ingredient_id in old_amounts.keys() - new_amounts.keys()
+        ]
+        changed = []
+        for ingredient_id in old_amounts.keys() & new_amounts.keys():
+            recipe_ingredient = current[ingredient_id]
+            if recipe_ingredient.amount != new_amounts[ingredient_id]:
+                recipe_ingredient.amount = new_amounts[ingredient_id]
+                changed.append(recipe_ingredient)
+
+        RecipeIngredient.objects.filter(pk__in=removed).delete()
+        self.create_recipe_ingredients(
+            recipe,
+            [item for item in ingredients_data if item["id"] not in current],
+        )
+        RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        ShoppingListItem.objects.change_recipe(
+            recipe, old_amounts, new_amounts
+        )
+        if old_amounts.keys() != new_amounts.keys():
+            RecipeSignature.objects.refresh([recipe.pk])
 
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        ingredients_data = validated_data.pop("ingredients", None)
+        instance = super().update(instance, validated_data)
+        if ingredients_data is not None:
+            self.update_recipe_ingredients(instance, ingredients_data)
         return instance
 
     def to_representation(self, instance):
@@ -0,0 +1,155 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api.authentication import cached_users
+from api.caching import (
+    invalidate_membership,
+    invalidate_postings,
+    invalidate_tags,
+)
+from api.catalog import catalog
+from api.pantry import pantry
+from api.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeSearchDocument,
+    ShoppingCart,
+    ShortLink,
+)
+from api.utils import schedule_image_variants
+from api.views import short_links
+from users.models import Subscription, User
+
+IMAGE_FIELDS = {
+    Recipe: "image",
+    User: "avatar",
+}
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def mark_image_upload(sender, instance, **kwargs):
+    """Запоминает, что вместе с объектом сохраняется новый файл."""
+    field_file = getattr(instance, IMAGE_FIELDS[sender])
+    instance._image_uploaded = bool(field_file) and not field_file._committed
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def create_image_variants(sender, instance, **kwargs):
+    """Генерирует копии изображения после загрузки нового файла."""
+    if getattr(instance, "_image_uploaded", False):
+        instance._image_uploaded = False
+        schedule_image_variants(getattr(instance, IMAGE_FIELDS[sender]))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    """Сбрасывает справочник ингредиентов после правок."""
+    catalog.invalidate()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Убирает пользователя из кэша аутентификации после изменений."""
+    cached_users.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=ShortLink)
+def evict_short_link(sender, instance, **kwargs):
+    """Убирает код удаленной ссылки из кэша перенаправлений."""
+    transaction.on_commit(lambda: short_links.delete(instance.code))
+
+
+# Теги кэша ответов, которые сбрасываются при изменении модели
+CACHE_TAGS = {
+    Recipe: ("recipes",),
+    RecipeIngredient: ("recipes",),
+    Ingredient: ("ingredients", "recipes"),
+    User: ("users", "recipes"),
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_responses(sender, **kwargs):
+    """Сбрасывает кэш ответов после фиксации транзакции."""
+    transaction.on_commit(lambda: invalidate_tags(*CACHE_TAGS[sender]))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def refresh_search_document(sender, instance, **kwargs):
+    """Пересобирает поисковый документ, когда состав уже сохранен."""
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(
+        lambda: RecipeSearchDocument.objects.refresh([recipe_id])
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_search_documents(sender, instance, created, **kwargs):
+    """Пересобирает документы рецептов с переименованным ингредиентом."""
+    if not created:
+        transaction.on_commit(
+            lambda: RecipeSearchDocument.objects.refresh(
+                instance.recipe_ingredients.values_list(
+                    "recipe_id", flat=True
+                )
+            )
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_ingredient_postings(sender, instance, **kwargs):
+    """Сбрасывает список рецептов ингредиента после правок через ORM."""
+    invalidate_postings([instance.ingredient_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_pantry(sender, instance, **kwargs):
+    """Обновляет строку рецепта в матрице составов после фиксации."""
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(lambda: pantry.changed(recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_pantry(sender, created=False, **kwargs):
+    """Перестраивает матрицу, когда меняется набор ингредиентов."""
+    if created or kwargs["signal"] is post_delete:
+        transaction.on_commit(pantry.invalidate)
+
+
+MEMBERSHIP_KINDS = {
+    Favorite: "favorites",
+    ShoppingCart: "cart",
+    Subscription: "follows",
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_membership(sender, instance, **kwargs):
+    """Сбрасывает множество пользователя после правок через ORM."""
+    invalidate_membership(instance.user_id, MEMBERSHIP_KINDS[sender])
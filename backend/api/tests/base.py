@@ -0,0 +1,112 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api.catalog import catalog
+from api.models import Ingredient
+from api.pantry import pantry
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+CACHES = {
+    alias: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": alias,
+    }
+    for alias in ("default", "versions")
+}
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=CACHES)
+class RecipeAPITestCase(APITestCase):
+    """Рецепты создаются через API, сбросы кэшей выполняются сразу."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        for alias in CACHES:
+            caches[alias].clear()
+        catalog.version = None
+        pantry.version = None
+        self.author = self.create_user("author")
+        self.client.force_authenticate(self.author)
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            email=f"{username}@example.com",
+            username=username,
+            password="Pa55word!",
+            first_name=username,
+            last_name=username,
+        )
+
+    @staticmethod
+    def create_ingredients(*names):
+        return [
+            Ingredient.objects.create(name=name, measurement_unit="г").pk
+            for name in names
+        ]
+
+    def request(self, method, url, data=None):
+        """Запрос, после которого выполнены обработчики on_commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format="json")
+        return response
+
+    def create_recipe(
+        self, ingredient_ids, name="Рецепт", text="Описание", cooking_time=10
+    ):
+        response = self.request(
+            "post",
+            "/api/recipes/",
+            {
+                "name": name,
+                "text": text,
+                "cooking_time": cooking_time,
+                "image": make_image(),
+                "ingredients": [
+                    {"id": pk, "amount": 10} for pk in ingredient_ids
+                ],
+            },
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def set_ingredients(self, recipe_id, ingredient_ids):
+        response = self.request(
+            "patch",
+            f"/api/recipes/{recipe_id}/",
+            {
+                "ingredients": [
+                    {"id": pk, "amount": 5} for pk in ingredient_ids
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def result_ids(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        data = response.data
+        results = data["results"] if isinstance(data, dict) else data
+        return [item["id"] for item in results]
@@ -0,0 +1,57 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory
+
+from api import async_views
+from api.tests.base import RecipeAPITestCase
+
+
+class AsyncReadViewTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.salt, self.flour = self.create_ingredients("Соль", "Мука")
+        self.recipes = [self.create_recipe([self.salt]) for _ in range(3)]
+        self.client.force_authenticate(None)
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, path, params=None, etag=None, **kwargs):
+        headers = {"If-None-Match": etag} if etag else {}
+        request = self.factory.get(path, params, headers=headers)
+        return async_to_sync(view)(request, **kwargs)
+
+    def assertSameAsSync(self, view, path, params=None, **kwargs):
+        response = self.call(view, path, params, **kwargs)
+        expected = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(response["ETag"], expected["ETag"])
+        return response
+
+    def test_ingredient_list(self):
+        view = async_views.ingredient_list
+        params = {"name": "с"}
+        etag = self.assertSameAsSync(view, "/api/ingredients/", params)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.call(view, "/api/ingredients/", params, etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_recipe_list(self):
+        view = async_views.recipe_list
+        params = {"limit": 2, "page": 2}
+        etag = self.assertSameAsSync(view, "/api/recipes/", params)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.call(view, "/api/recipes/", params, etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_recipe_list_page_out_of_range(self):
+        response = self.call(
+            async_views.recipe_list, "/api/recipes/", {"limit": 2, "page": 3}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_recipe_detail(self):
+        pk = self.recipes[0]
+        self.assertSameAsSync(
+            async_views.recipe_detail, f"/api/recipes/{pk}/", pk=pk
+        )
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import CachedJWTAuthentication, cached_users
+from api.tests.base import RecipeAPITestCase, make_image
+from users.models import User
+
+NEW_PASSWORD = "N3wPa55word!"
+
+
+class CachedJWTAuthenticationTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        cached_users.entries.clear()
+        self.client.force_authenticate(None)
+        self.login(AccessToken.for_user(self.author))
+
+    def login(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def change_password_elsewhere(self):
+        """Меняет пароль в обход сигналов, как другой процесс."""
+        User.objects.filter(pk=self.author.pk).update(
+            password=make_password(NEW_PASSWORD)
+        )
+
+    def test_write_request_does_not_save_stale_user(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        self.change_password_elsewhere()
+        response = self.request(
+            "put", "/api/users/me/avatar/", {"avatar": make_image()}
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.check_password(NEW_PASSWORD))
+
+    def test_set_password_keeps_other_fields(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        User.objects.filter(pk=self.author.pk).update(first_name="Новое")
+        response = self.request(
+            "post",
+            "/api/users/set_password/",
+            {"current_password": "Pa55word!", "new_password": NEW_PASSWORD},
+        )
+        self.assertEqual(response.status_code, 204, response.data)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.first_name, "Новое")
+        self.assertTrue(self.author.check_password(NEW_PASSWORD))
+
+    def test_token_without_user_id_is_rejected(self):
+        self.login(AccessToken())
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+
+    @mock.patch.object(api_settings, "CHECK_REVOKE_TOKEN", True)
+    def test_cached_user_with_changed_password_is_rejected(self):
+        token = AccessToken.for_user(self.author)
+        self.login(token)
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        self.change_password_elsewhere()
+        cached_users.set(User.objects.get(pk=self.author.pk))
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(CachedJWTAuthentication().aget_user)(token)
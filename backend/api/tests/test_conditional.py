@@ -0,0 +1,61 @@
+from api.models import Favorite, Ingredient
+from api.tests.base import RecipeAPITestCase
+
+
+class ConditionalGetTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.salt, self.flour = self.create_ingredients("Соль", "Мука")
+        self.recipe = self.create_recipe([self.salt])
+
+    def assertNotModified(self, url, etag, queries=None):
+        if queries is None:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        else:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_ingredient_search_is_validated_without_queries(self):
+        url = "/api/ingredients/?name=со&name__icontains=ль"
+        etag = self.get_etag(url)
+        self.assertNotModified(url, etag, queries=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.get(pk=self.salt).save()
+        self.assertNotEqual(self.get_etag(url), etag)
+
+    def test_recipe_list_is_validated_without_queries(self):
+        url = "/api/recipes/?limit=2"
+        etag = self.get_etag(url)
+        self.assertNotModified(url, etag, queries=0)
+
+    def test_recipe_list_changes_with_recipes(self):
+        url = "/api/recipes/"
+        etag = self.get_etag(url)
+        self.request(
+            "patch", f"/api/recipes/{self.recipe}/", {"name": "Новое"}
+        )
+        self.assertNotEqual(self.get_etag(url), etag)
+
+    def test_recipe_list_changes_with_membership(self):
+        url = "/api/recipes/"
+        etag = self.get_etag(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.add(self.author, [self.recipe])
+        self.assertNotEqual(self.get_etag(url), etag)
+
+    def test_recipe_detail(self):
+        url = f"/api/recipes/{self.recipe}/"
+        self.client.force_authenticate(None)
+        response = self.client.get(url)
+        self.assertIn("Last-Modified", response)
+        self.assertNotModified(url, response["ETag"])
+        self.client.force_authenticate(self.author)
+        self.request("patch", url, {"name": "Новое название"})
+        self.client.force_authenticate(None)
+        self.assertNotEqual(self.get_etag(url), response["ETag"])
@@ -0,0 +1,61 @@
+from django.test import override_settings
+
+from api.models import FeedEntry, Recipe
+from api.tests.base import RecipeAPITestCase
+
+
+class FeedTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients("Соль")
+        self.followers = [
+            self.create_user(f"follower{number}") for number in range(3)
+        ]
+
+    def subscribe(self, user, method="post"):
+        self.client.force_authenticate(user)
+        response = self.request(
+            method, f"/api/users/{self.author.pk}/subscribe/"
+        )
+        self.client.force_authenticate(self.author)
+        return response
+
+    def publish(self):
+        return self.create_recipe(self.ingredients)
+
+    def feed(self, user):
+        self.client.force_authenticate(user)
+        ids = self.result_ids("/api/recipes/feed/", {"limit": 100})
+        self.client.force_authenticate(self.author)
+        return ids
+
+    def test_subscribe_publish_unsubscribe(self):
+        old = self.publish()
+        follower = self.followers[0]
+        self.assertEqual(self.subscribe(follower).status_code, 201)
+        self.assertEqual(self.feed(follower), [old])
+        new = self.publish()
+        self.assertEqual(self.feed(follower), [new, old])
+        self.assertEqual(FeedEntry.objects.direct_authors(follower), [])
+        self.assertEqual(self.subscribe(follower, "delete").status_code, 204)
+        self.assertEqual(self.feed(follower), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_crossing_fanout_limit_keeps_recipes(self):
+        first, second, third = self.followers
+        self.subscribe(first)
+        copied = self.publish()
+        self.subscribe(second)
+        direct = self.publish()
+        self.assertEqual(
+            dict(Recipe.objects.values_list("id", "in_feeds")),
+            {copied: True, direct: False},
+        )
+        self.assertEqual(self.feed(second), [direct, copied])
+
+        self.subscribe(second, "delete")
+        self.assertEqual(self.feed(first), [direct, copied])
+        self.subscribe(third)
+        latest = self.publish()
+        for follower in (first, third):
+            self.assertEqual(self.feed(follower), [latest, direct, copied])
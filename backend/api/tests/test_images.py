@@ -0,0 +1,54 @@
+import base64
+import io
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework import serializers
+
+from api.utils import decode_base64_image
+
+
+def make_png(side=64):
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(
+        buffer, "PNG"
+    )
+    return buffer.getvalue()
+
+
+def wrapped_data_uri(content):
+    """data URI с переносами строк MIME через каждые 76 символов."""
+    encoded = base64.encodebytes(content).decode().replace("\n", "\r\n")
+    return "data:image/png;base64," + encoded
+
+
+class DecodeBase64ImageTests(SimpleTestCase):
+    def setUp(self):
+        self.content = make_png()
+
+    def decode(self, data):
+        upload = decode_base64_image(data)
+        self.addCleanup(upload.close)
+        return upload.read()
+
+    def test_wrapped_payload_at_limit_is_accepted(self):
+        with override_settings(IMAGE_MAX_BYTES=len(self.content)):
+            self.assertEqual(
+                self.decode(wrapped_data_uri(self.content)), self.content
+            )
+
+    def test_wrapped_payload_over_limit_is_rejected(self):
+        with override_settings(IMAGE_MAX_BYTES=len(self.content) - 1):
+            with self.assertRaisesMessage(
+                serializers.ValidationError, "Размер изображения"
+            ):
+                decode_base64_image(wrapped_data_uri(self.content))
+
+    def test_line_breaks_across_chunks(self):
+        # Части не кратны 4 и режут строки посередине
+        with mock.patch("api.utils.BASE64_CHUNK_SIZE", 101):
+            self.assertEqual(
+                self.decode(wrapped_data_uri(self.content)), self.content
+            )
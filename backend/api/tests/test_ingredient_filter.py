@@ -0,0 +1,67 @@
+from django.test import override_settings
+
+from api.tests.base import RecipeAPITestCase
+
+
+class IngredientFilterTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients(
+            "Соль", "Мука", "Яйца", "Молоко", "Сахар"
+        )
+        salt, flour, eggs, milk, sugar = self.ingredients
+        self.bread = self.create_recipe([salt, flour])
+        self.omelette = self.create_recipe([salt, eggs])
+        self.pancakes = self.create_recipe([flour, eggs, milk])
+        self.syrup = self.create_recipe([sugar])
+
+    def filter(self, *indexes, mode=None):
+        params = {
+            "ingredients": ",".join(
+                str(self.ingredients[index]) for index in indexes
+            ),
+            "limit": 100,
+        }
+        if mode:
+            params["ingredients_mode"] = mode
+        return sorted(self.result_ids("/api/recipes/", params))
+
+    def test_all_mode_is_default(self):
+        self.assertEqual(self.filter(0), [self.bread, self.omelette])
+        self.assertEqual(self.filter(0, 1), [self.bread])
+        self.assertEqual(self.filter(0, 1, mode="all"), [self.bread])
+
+    def test_any_mode(self):
+        self.assertEqual(
+            self.filter(0, 3, mode="any"),
+            [self.bread, self.omelette, self.pancakes],
+        )
+
+    def test_none_mode(self):
+        self.assertEqual(
+            self.filter(0, 4, mode="none"), [self.pancakes]
+        )
+
+    def test_unknown_ingredient(self):
+        params = {"ingredients": "99999"}
+        self.assertEqual(self.result_ids("/api/recipes/", params), [])
+        params["ingredients_mode"] = "none"
+        self.assertEqual(len(self.result_ids("/api/recipes/", params)), 4)
+
+    def test_results_follow_ingredient_edit(self):
+        salt, flour = self.ingredients[:2]
+        self.set_ingredients(self.syrup, [salt, flour])
+        self.assertEqual(self.filter(0, 1), [self.bread, self.syrup])
+        self.assertEqual(self.filter(4, mode="any"), [])
+
+    def test_invalid_mode(self):
+        response = self.client.get(
+            "/api/recipes/", {"ingredients": "1", "ingredients_mode": "x"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(INGREDIENT_FILTER_LIMIT=2)
+    def test_newest_recipes_within_limit(self):
+        self.assertEqual(
+            self.filter(0, 1, mode="any"), [self.omelette, self.pancakes]
+        )
@@ -0,0 +1,62 @@
+from api.models import Favorite, Recipe, ShoppingCart, ShoppingListItem
+from api.tests.base import RecipeAPITestCase
+
+
+class MembershipTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.salt, self.flour = self.create_ingredients("Соль", "Мука")
+        self.first = self.create_recipe([self.salt, self.flour])
+        self.second = self.create_recipe([self.salt])
+
+    def counter(self, recipe_id, field):
+        return Recipe.objects.values_list(field, flat=True).get(pk=recipe_id)
+
+    def shopping_list(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.author).values_list(
+                "ingredient_id", "total_amount"
+            )
+        )
+
+    def test_add_returns_only_new_recipes(self):
+        added = Favorite.objects.add(self.author, [self.first, 99999])
+        self.assertEqual(added, [self.first])
+        added = Favorite.objects.add(self.author, [self.first, self.second])
+        self.assertEqual(added, [self.second])
+        self.assertEqual(Favorite.objects.add(self.author, [self.first]), [])
+        self.assertEqual(self.counter(self.first, "favorites_count"), 1)
+        self.assertEqual(
+            Favorite.objects.filter(user=self.author).count(), 2
+        )
+
+    def test_remove_returns_only_removed_recipes(self):
+        Favorite.objects.add(self.author, [self.first])
+        removed = Favorite.objects.remove(
+            self.author, [self.first, self.second]
+        )
+        self.assertEqual(removed, [self.first])
+        removed = Favorite.objects.remove(self.author, [self.first])
+        self.assertEqual(removed, [])
+        self.assertEqual(self.counter(self.first, "favorites_count"), 0)
+
+    def test_shopping_list_follows_cart(self):
+        ShoppingCart.objects.add(self.author, [self.first, self.second])
+        ShoppingCart.objects.add(self.author, [self.first])
+        self.assertEqual(
+            self.shopping_list(), {self.salt: 20, self.flour: 10}
+        )
+
+        ShoppingCart.objects.remove(self.author, [self.first])
+        ShoppingCart.objects.remove(self.author, [self.first])
+        self.assertEqual(self.shopping_list(), {self.salt: 10})
+        self.assertEqual(self.counter(self.first, "shopping_carts_count"), 0)
+
+    def test_repeated_requests_are_rejected(self):
+        url = f"/api/recipes/{self.first}/favorite/"
+        self.assertEqual(self.request("post", url).status_code, 201)
+        self.assertEqual(self.request("post", url).status_code, 400)
+        self.assertEqual(self.counter(self.first, "favorites_count"), 1)
+        self.assertEqual(self.request("delete", url).status_code, 204)
+        self.assertEqual(self.request("delete", url).status_code, 400)
+        self.assertEqual(self.counter(self.first, "favorites_count"), 0)
@@ -0,0 +1,36 @@
+from api.tests.base import RecipeAPITestCase
+
+
+class CursorPaginationTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients("Соль")
+        self.recipe_ids = [
+            self.create_recipe(self.ingredients) for _ in range(7)
+        ]
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_new_recipe_does_not_shift_pages(self):
+        response = self.client.get("/api/recipes/?cursor=&limit=3")
+        first_page = [item["id"] for item in response.data["results"]]
+        self.create_recipe(self.ingredients)
+        rest = self.collect(response.data["next"])
+        self.assertEqual(first_page + rest, self.recipe_ids[::-1])
+
+    def test_cursor_matches_page_numbers(self):
+        url = "/api/recipes/?limit=2"
+        self.assertEqual(self.collect(url + "&cursor="), self.collect(url))
+
+    def test_deleted_recipe_does_not_shift_pages(self):
+        response = self.client.get("/api/recipes/?cursor=&limit=3")
+        self.request("delete", f"/api/recipes/{self.recipe_ids[-1]}/")
+        rest = self.collect(response.data["next"])
+        self.assertEqual(rest, self.recipe_ids[-4::-1])
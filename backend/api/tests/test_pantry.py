@@ -0,0 +1,89 @@
+from unittest import mock
+
+from api.pantry import PantryIndex
+from api.tests.base import RecipeAPITestCase
+
+
+class PantryTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients(
+            "Соль", "Мука", "Яйца", "Молоко"
+        )
+        salt, flour, eggs, milk = self.ingredients
+        self.bread = self.create_recipe([salt, flour])
+        self.pancakes = self.create_recipe([flour, eggs, milk])
+        self.omelette = self.create_recipe([eggs, milk])
+
+    def rank(self, *ingredient_ids, **params):
+        response = self.client.get(
+            "/api/recipes/pantry/",
+            {"ingredients": ",".join(map(str, ingredient_ids)), **params},
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [
+            (item["id"], item["matched_count"], item["missing_count"])
+            for item in response.data["results"]
+        ]
+
+    def test_most_complete_recipes_first(self):
+        salt, flour, eggs, _ = self.ingredients
+        self.assertEqual(
+            self.rank(salt, flour, eggs),
+            [(self.bread, 2, 0), (self.pancakes, 2, 1), (self.omelette, 1, 1)],
+        )
+
+    def test_max_missing(self):
+        salt, flour, eggs, _ = self.ingredients
+        self.assertEqual(
+            self.rank(salt, flour, eggs, max_missing=0), [(self.bread, 2, 0)]
+        )
+        self.assertEqual(
+            self.rank(eggs, max_missing=1), [(self.omelette, 1, 1)]
+        )
+        self.assertEqual(
+            self.rank(eggs, max_missing=2),
+            [(self.omelette, 1, 1), (self.pancakes, 1, 2)],
+        )
+
+    def test_negative_max_missing_is_rejected(self):
+        response = self.client.get(
+            "/api/recipes/pantry/",
+            {"ingredients": self.ingredients[0], "max_missing": -1},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_results_follow_ingredient_edit(self):
+        salt, flour, eggs, milk = self.ingredients
+        self.set_ingredients(self.omelette, [salt])
+        self.assertEqual(
+            self.rank(salt, max_missing=0), [(self.omelette, 1, 0)]
+        )
+        self.assertEqual(
+            self.rank(eggs, milk, max_missing=1), [(self.pancakes, 2, 1)]
+        )
+
+    def test_recipe_edits_update_rows_in_place(self):
+        salt, flour, eggs, milk = self.ingredients
+        self.rank(salt)
+        with mock.patch.object(
+            PantryIndex, "build", autospec=True, side_effect=PantryIndex.build
+        ) as build:
+            self.set_ingredients(self.bread, [eggs])
+            pie = self.create_recipe([salt, milk])
+            self.request("delete", f"/api/recipes/{self.pancakes}/")
+            self.assertEqual(
+                self.rank(salt, eggs, milk),
+                [
+                    (pie, 2, 0),
+                    (self.omelette, 2, 0),
+                    (self.bread, 1, 0),
+                ],
+            )
+        build.assert_not_called()
+
+    def test_recipe_with_new_ingredient(self):
+        self.rank(self.ingredients[0])
+        (sugar,) = self.create_ingredients("Сахар")
+        cake = self.create_recipe([sugar])
+        self.assertEqual(self.rank(sugar), [(cake, 1, 0)])
@@ -0,0 +1,69 @@
+import io
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.models import Favorite, RecipeRanking, ShoppingCart
+from api.tests.base import RecipeAPITestCase
+
+
+class RankingTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients("Соль")
+        self.recipes = [self.create_recipe(self.ingredients) for _ in range(5)]
+        self.fans = [self.create_user(f"fan{number}") for number in range(3)]
+
+    def compute(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("compute_rankings", stdout=io.StringIO())
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_popular_order(self):
+        for number, fan in enumerate(self.fans):
+            Favorite.objects.add(fan, self.recipes[: number + 1])
+        ShoppingCart.objects.add(self.fans[0], [self.recipes[0]])
+        self.compute()
+        newest = self.create_recipe(self.ingredients)
+        ids = self.collect("/api/recipes/?ordering=popular&limit=2")
+        self.assertEqual(ids[:3], self.recipes[:3])
+        # Рецепты без места идут в конце по дате публикации
+        self.assertEqual(ids[3:], [newest, *self.recipes[:2:-1]])
+
+    def test_trending_skips_old_and_undated_rows(self):
+        old, undated, recent = self.recipes[:3]
+        Favorite.objects.add(self.fans[0], [old, undated, recent])
+        Favorite.objects.add(self.fans[1], [old, undated])
+        Favorite.objects.filter(recipe_id=old).update(
+            created_at=timezone.now() - timedelta(days=365)
+        )
+        Favorite.objects.filter(recipe_id=undated).update(created_at=None)
+        self.compute()
+        rankings = dict(
+            RecipeRanking.objects.values_list("recipe_id", "trending_score")
+        )
+        self.assertEqual(rankings[old], 0)
+        self.assertEqual(rankings[undated], 0)
+        self.assertGreater(rankings[recent], 0)
+        ids = self.collect("/api/recipes/?ordering=trending")
+        self.assertEqual(ids[0], recent)
+
+    def test_cursor_matches_page_numbers(self):
+        for number, fan in enumerate(self.fans):
+            Favorite.objects.add(fan, self.recipes[number:number + 2])
+        self.compute()
+        for ordering in ("popular", "trending", "cooking_time"):
+            with self.subTest(ordering=ordering):
+                url = f"/api/recipes/?limit=2&ordering={ordering}"
+                self.assertEqual(
+                    self.collect(url + "&cursor="), self.collect(url)
+                )
@@ -0,0 +1,44 @@
+from api.tests.base import RecipeAPITestCase
+
+
+class RecipeSearchTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.potato, self.salt = self.create_ingredients(
+            "Картофель молодой", "Соль"
+        )
+        self.mash = self.create_recipe(
+            [self.potato], name="Пюре", text="Сварить и размять"
+        )
+        self.soup = self.create_recipe(
+            [self.potato],
+            name="Суп картофельный",
+            text="Картофель, картофель и ещё раз картофель",
+        )
+        self.salad = self.create_recipe(
+            [self.salt], name="Салат", text="Нарезать овощи"
+        )
+
+    def search(self, query, **params):
+        return self.result_ids("/api/recipes/", {"search": query, **params})
+
+    def test_best_match_comes_first(self):
+        self.assertEqual(self.search("картоф"), [self.soup, self.mash])
+
+    def test_query_is_normalized(self):
+        self.assertEqual(self.search("КАРТОФ"), [self.soup, self.mash])
+        self.assertEqual(self.search("еще"), [self.soup])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search("картофель салат"), [])
+        self.assertEqual(self.search("салат соль"), [self.salad])
+
+    def test_cursor_keeps_ranking(self):
+        self.assertEqual(
+            self.search("картоф", cursor="", limit=1), [self.soup]
+        )
+
+    def test_document_follows_ingredient_edit(self):
+        self.set_ingredients(self.salad, [self.potato])
+        self.assertEqual(self.search("соль"), [])
+        self.assertIn(self.salad, self.search("картофель"))
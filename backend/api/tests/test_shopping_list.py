@@ -0,0 +1,94 @@
+import io
+
+from django.core.management import call_command
+
+from api.models import Ingredient, ShoppingCart, ShoppingListItem
+from api.tests.base import RecipeAPITestCase
+
+
+class ShoppingListTotalsTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.salt, self.flour, self.eggs = self.create_ingredients(
+            "Соль", "Мука", "Яйца"
+        )
+        self.bread = self.create_recipe([self.salt, self.flour])
+        self.omelette = self.create_recipe([self.salt, self.eggs])
+        self.buyer = self.create_user("buyer")
+        ShoppingCart.objects.add(self.author, [self.bread, self.omelette])
+        ShoppingCart.objects.add(self.buyer, [self.bread])
+
+    def totals(self, user):
+        return dict(
+            ShoppingListItem.objects.filter(user=user).values_list(
+                "ingredient_id", "total_amount"
+            )
+        )
+
+    def assertMatchesCarts(self):
+        call_command(
+            "rebuild_shopping_lists", check=True, stdout=io.StringIO()
+        )
+
+    def test_totals_follow_cart(self):
+        self.assertEqual(
+            self.totals(self.author),
+            {self.salt: 20, self.flour: 10, self.eggs: 10},
+        )
+        self.assertEqual(
+            self.totals(self.buyer), {self.salt: 10, self.flour: 10}
+        )
+        self.assertMatchesCarts()
+
+    def test_totals_follow_recipe_edit(self):
+        self.set_ingredients(self.bread, [self.flour, self.eggs])
+        self.assertEqual(
+            self.totals(self.author),
+            {self.salt: 10, self.flour: 5, self.eggs: 15},
+        )
+        self.assertEqual(
+            self.totals(self.buyer), {self.flour: 5, self.eggs: 5}
+        )
+        self.assertMatchesCarts()
+
+    def test_deleted_recipe_leaves_no_empty_rows(self):
+        self.request("delete", f"/api/recipes/{self.bread}/")
+        self.assertEqual(
+            self.totals(self.author), {self.salt: 10, self.eggs: 10}
+        )
+        self.assertEqual(self.totals(self.buyer), {})
+        self.assertFalse(
+            ShoppingListItem.objects.filter(total_amount__lte=0).exists()
+        )
+        self.assertMatchesCarts()
+
+
+class ShoppingListDownloadTests(RecipeAPITestCase):
+    url = "/api/recipes/download_shopping_cart/"
+
+    def setUp(self):
+        super().setUp()
+        (self.salt,) = self.create_ingredients("Соль")
+        ShoppingCart.objects.add(
+            self.author, [self.create_recipe([self.salt])]
+        )
+
+    def download(self, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get(self.url, {"format": "txt"}, headers=headers)
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.download()["ETag"]
+        self.assertEqual(self.download(etag).status_code, 304)
+
+    def test_etag_follows_ingredient_rename(self):
+        response = self.download()
+        Ingredient.objects.filter(pk=self.salt).update(
+            name="Соль морская", measurement_unit="щепотка"
+        )
+        renamed = self.download(response["ETag"])
+        self.assertEqual(renamed.status_code, 200)
+        self.assertNotEqual(renamed["ETag"], response["ETag"])
+        self.assertIn(
+            "Соль морская", b"".join(renamed.streaming_content).decode()
+        )
@@ -0,0 +1,46 @@
+from api.tests.base import RecipeAPITestCase
+
+
+class SimilarRecipesTests(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients(
+            *(f"Ингредиент {number}" for number in range(30))
+        )
+        self.base = self.ingredients[:10]
+        self.recipe = self.create_recipe(self.base)
+        self.close = self.create_recipe(
+            self.base[:9] + [self.ingredients[20]]
+        )
+        self.other = self.create_recipe(self.ingredients[25:])
+
+    def similar(self, recipe_id, **params):
+        response = self.client.get(
+            f"/api/recipes/{recipe_id}/similar/", params
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(item["id"], item["similarity"]) for item in response.data]
+
+    def test_similar_recipes(self):
+        similar = self.similar(self.recipe)
+        self.assertEqual([pk for pk, _ in similar], [self.close])
+        self.assertGreater(similar[0][1], 0.5)
+        self.assertEqual(self.similar(self.other), [])
+
+    def test_results_follow_ingredient_edit(self):
+        self.set_ingredients(self.other, self.base)
+        similar = self.similar(self.recipe)
+        self.assertEqual(similar[0], (self.other, 1.0))
+        self.assertEqual(
+            [pk for pk, _ in similar], [self.other, self.close]
+        )
+        self.assertEqual(self.similar(self.recipe, limit=1), similar[:1])
+
+        self.set_ingredients(self.other, self.ingredients[25:])
+        self.assertEqual(
+            [pk for pk, _ in self.similar(self.recipe)], [self.close]
+        )
+
+    def test_unknown_recipe(self):
+        response = self.client.get("/api/recipes/99999/similar/")
+        self.assertEqual(response.status_code, 404)
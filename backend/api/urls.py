@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView
+from . import async_views
 from .views import (
     IngredientViewSet,
     RecipeViewSet,
@@ -13,7 +15,18 @@ router.register("users", UserViewSet, basename="users")
 router.register("ingredients", IngredientViewSet, basename="ingredients")
 router.register("recipes", RecipeViewSet, basename="recipes")
 
-urlpatterns = [
+urlpatterns = []
+if settings.ASYNC_READ_VIEWS:
+    # Под ASGI частые запросы на чтение обслуживаются асинхронно
+    urlpatterns += [
+        path("auth/token/login/", async_views.login),
+        path("users/subscriptions/", async_views.subscriptions),
+        path("ingredients/", async_views.ingredient_list),
+        path("recipes/", async_views.recipe_list),
+        path("recipes/<int:pk>/", async_views.recipe_detail),
+    ]
+
+urlpatterns += [
     path("auth/token/login/", CustomTokenLoginView.as_view(), name="login"),
     path("auth/", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
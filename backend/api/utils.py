@@ -1,22 +1,289 @@
 import base64
-import uuid
-import six
-import filetype
-from rest_framework import serializers
+import binascii
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from django.db import transaction
+from PIL import Image
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+TRUE_VALUES = ("1", "true", "yes")
+DATA_URI_PATTERN = re.compile(r"data:image/(?P<ext>[\w.+-]+);base64,")
+# Размер части строки base64 при декодировании; неполная четверка
+# символов после удаления переносов переходит в следующую часть
+BASE64_CHUNK_SIZE = 64 * 1024
+# Строки base64 с переносами не длиннее 64 символов плюс CRLF
+BASE64_LINE_LENGTH = 64
+BASE64_LINE_BREAK = 2
+BASE64_JUNK_PATTERN = re.compile(r"[^A-Za-z0-9+/=]")
+VARIANT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+BASE62_ALPHABET = (
+    "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+)
+
+
+def encode_base62(number):
+    """Записывает неотрицательное целое в base62."""
+    digits = []
+    while True:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+        if not number:
+            return "".join(reversed(digits))
+
+
+class LRUCache:
+    """Потокобезопасный кэш в памяти процесса с вытеснением старых ключей.
+
+    Если задан ttl (в секундах), записи старше него считаются устаревшими.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            expires, value = self.data[key]
+            if expires is not None and expires < time.monotonic():
+                del self.data[key]
+                return default
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+        with self.lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class CounterFieldsMixin:
+    """Не перезаписывает счетчики при сохранении объекта целиком.
+
+    Счетчики меняются только запросами с F(), а в объекте в памяти
+    могут быть устаревшие значения.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def get_variant_name(name, variant):
+    """Имя файла уменьшенной копии изображения."""
+    root, _ = os.path.splitext(name)
+    extension = VARIANT_EXTENSIONS[settings.IMAGE_VARIANT_FORMAT]
+    return f"{root}_{variant}.{extension}"
+
+
+def generate_image_variants(storage, name):
+    """Создает копии изображения всех размеров из IMAGE_VARIANTS."""
+    with storage.open(name, "rb") as f:
+        image = Image.open(f)
+        image.load()
+    image = image.convert("RGB")
+
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size)
+        buffer = BytesIO()
+        resized.save(
+            buffer, settings.IMAGE_VARIANT_FORMAT, quality=85, optimize=True
+        )
+        variant_name = get_variant_name(name, variant)
+        if storage.exists(variant_name):
+            storage.delete(variant_name)
+        storage.save(variant_name, ContentFile(buffer.getvalue()))
+
+
+def process_image(storage, name):
+    try:
+        generate_image_variants(storage, name)
+    except (OSError, ValueError):
+        logger.exception("Не удалось создать копии изображения %s", name)
+
+
+image_executor = None
+if settings.IMAGE_WORKERS:
+    image_executor = ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS, thread_name_prefix="images"
+    )
+
+
+def schedule_image_variants(field_file):
+    """Создает копии изображения в пуле потоков после фиксации транзакции.
+
+    При IMAGE_WORKERS = 0 копии создаются сразу, в текущем потоке.
+    """
+    storage, name = field_file.storage, field_file.name
+
+    def submit():
+        if image_executor is None:
+            process_image(storage, name)
+        else:
+            image_executor.submit(process_image, storage, name)
+
+    transaction.on_commit(submit)
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """Декодированное изображение во временном файле на диске."""
+
+    def __del__(self):
+        # Хранилище могло переместить файл, close() это учитывает
+        self.close()
+
+
+def decode_base64_image(data):
+    """Декодирует data URI по частям с проверкой размера и разрешения.
+
+    Заведомо большие строки отклоняются по длине с запасом на переносы
+    строк MIME, точный размер проверяется при декодировании. Разрешение
+    проверяется по заголовку изображения, без распаковки пикселей. Как и
+    обычные загрузки, файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся
+    на диск.
+    """
+    match = DATA_URI_PATTERN.match(data)
+    if match is None:
+        raise serializers.ValidationError(
+            "Ожидается изображение в формате data:image/...;base64,"
+        )
+    start = match.end()
+    too_large = serializers.ValidationError(
+        "Размер изображения не должен превышать "
+        f"{settings.IMAGE_MAX_BYTES // (1024 * 1024)} МБ."
+    )
+    size = (
+        (len(data) - start)
+        * BASE64_LINE_LENGTH
+        // (BASE64_LINE_LENGTH + BASE64_LINE_BREAK)
+        * 3
+        // 4
+    )
+    if size > settings.IMAGE_MAX_BYTES:
+        raise too_large
+
+    ext = match.group("ext")
+    args = (f"image.{ext}", f"image/{ext}", size, None)
+    if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        upload = DecodedImageFile(*args)
+    else:
+        upload = InMemoryUploadedFile(BytesIO(), None, *args)
+    try:
+        # Символы вне алфавита (переносы строк MIME) отбрасываются, как
+        # в b64decode, а неполная четверка переносится в следующую часть
+        rest = ""
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = rest + BASE64_JUNK_PATTERN.sub(
+                "", data[offset:offset + BASE64_CHUNK_SIZE]
+            )
+            aligned = len(chunk) - len(chunk) % 4
+            upload.file.write(base64.b64decode(chunk[:aligned]))
+            rest = chunk[aligned:]
+        if rest:
+            upload.file.write(base64.b64decode(rest))
+        upload.size = upload.file.tell()
+        if upload.size > settings.IMAGE_MAX_BYTES:
+            upload.close()
+            raise too_large
+        upload.file.seek(0)
+        with Image.open(upload.file) as image:
+            width, height = image.size
+    except (binascii.Error, OSError, Image.DecompressionBombError):
+        upload.close()
+        raise serializers.ValidationError("Загрузите корректное изображение.")
+    if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+        upload.close()
+        raise serializers.ValidationError(
+            "Разрешение изображения не должно превышать "
+            f"{settings.IMAGE_MAX_DIMENSION} пикселей по стороне."
+        )
+    upload.file.seek(0)
+    return upload
+
+
+def delete_image_variants(field_file):
+    """Удаляет уменьшенные копии изображения."""
+    storage = field_file.storage
+    for variant in settings.IMAGE_VARIANTS:
+        name = get_variant_name(field_file.name, variant)
+        if storage.exists(name):
+            storage.delete(name)
 
 
 class Base64ImageField(serializers.ImageField):
+    """Принимает изображение в base64, отдает ссылку на файл.
+
+    Размер копии выбирается параметром ?image_size=thumbnail|card|full,
+    без него отдается исходный файл. Встраивание изображения в base64
+    оставлено для совместимости: ?inline_images=true или настройка
+    IMAGE_INLINE_BASE64.
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f"image.{ext}")
+            data = decode_base64_image(data)
         return super().to_internal_value(data)
 
     def to_representation(self, value):
         if not value:
             return None
+        request = self.context.get("request")
+        params = request.GET if request is not None else {}
+
+        inline = params.get("inline_images", "").lower() in TRUE_VALUES
+        if inline or settings.IMAGE_INLINE_BASE64:
+            return self.to_base64(value)
+
+        variant = params.get("image_size")
+        if variant in settings.IMAGE_VARIANTS:
+            url = value.storage.url(get_variant_name(value.name, variant))
+        else:
+            url = value.url
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_base64(self, value):
         try:
             with value.open("rb") as f:
                 base64_data = base64.b64encode(f.read()).decode("utf-8")
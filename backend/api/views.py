@@ -1,8 +1,11 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from collections import defaultdict
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
 from django.urls import reverse
-from django.shortcuts import get_object_or_404
-from django.db import IntegrityError
+from django.shortcuts import get_object_or_404, redirect
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action
@@ -12,38 +15,82 @@ from rest_framework.permissions import (
     AllowAny,
     IsAuthenticatedOrReadOnly,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
 from rest_framework.serializers import ValidationError
 from django.core.files.base import ContentFile
+import hashlib
 import re
 import base64
-from .filters import IngredientFilter, RecipeFilter
+from .caching import AnonymousCacheMixin
+from .catalog import catalog
+from .conditional import ConditionalGetMixin
+from .filters import (
+    ORDERING_POSITIONS,
+    POSITION_ORDERING,
+    IngredientFilter,
+    RecipeFilter,
+)
 from .models import (
     Favorite,
+    FeedEntry,
     Ingredient,
     Recipe,
-    RecipeIngredient,
+    RecipeSignature,
     ShoppingCart,
+    ShoppingListItem,
+    ShortLink,
 )
-from .pagination import CustomPagination
+from .pagination import CustomPagination, ListPagination
+from .pantry import pantry as pantry_index
 from .permissions import IsAuthorOrReadOnly
+from .renderers import (
+    CSVRenderer,
+    PDFRenderer,
+    PlainTextRenderer,
+    shopping_list_csv,
+    shopping_list_pdf,
+    shopping_list_txt,
+)
+from .utils import LRUCache, delete_image_variants
 from .serializers import (
     IngredientSerializer,
+    PantrySerializer,
     RecipeCreateSerializer,
+    RecipeIdsSerializer,
     RecipeReadSerializer,
     RecipeShortSerializer,
+    SimilarRecipeSerializer,
     SubscriptionSerializer,
     UserSerializer,
     UserCreateSerializer,
     UserSimpleSerializer,
     SetPasswordSerializer,
+    get_recipes_limit,
 )
 from users.models import Subscription, User
 from django.contrib.auth import authenticate
 
+CATALOG_PARAMS = {"name", "name__istartswith", "name__icontains"}
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHORT_LINKS_CACHE_SIZE = 10000
+SHORT_LINKS_CACHE_TTL = 60
+SIMILAR_LIMIT = 6
+MAX_SIMILAR_LIMIT = 30
+SHOPPING_LIST_EXPORTS = {
+    PlainTextRenderer.format: (PlainTextRenderer, shopping_list_txt),
+    CSVRenderer.format: (CSVRenderer, shopping_list_csv),
+    PDFRenderer.format: (PDFRenderer, shopping_list_pdf),
+}
+
+# Коды коротких ссылок, уже найденные этим процессом. При удалении
+# рецепта запись сбрасывается здесь (см. api.signals), в остальных
+# процессах живет не дольше SHORT_LINKS_CACHE_TTL секунд
+short_links = LRUCache(SHORT_LINKS_CACHE_SIZE, ttl=SHORT_LINKS_CACHE_TTL)
+
 
 class CustomTokenLoginView(APIView):
     permission_classes = [AllowAny]
@@ -66,9 +113,17 @@ class CustomTokenLoginView(APIView):
         )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPagination
+    validator_tags = ("users",)
+    membership_kinds = ("follows",)
+
+    @property
+    def cursor_ordering(self):
+        if self.action == "subscriptions":
+            return ("-id",)
+        return ("id",)
 
     def get_serializer(self, *args, **kwargs):
         kwargs["context"] = self.get_serializer_context()
@@ -133,7 +188,7 @@ class UserViewSet(viewsets.ModelViewSet):
             )
 
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=["password"])
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -150,6 +205,7 @@ class UserViewSet(viewsets.ModelViewSet):
             # Проверяем, что аватар реально файл
             if not user.avatar or not hasattr(user.avatar, "path"):
                 return Response(status=status.HTTP_204_NO_CONTENT)
+            delete_image_variants(user.avatar)
             user.avatar.delete(save=True)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -178,10 +234,29 @@ class UserViewSet(viewsets.ModelViewSet):
         detail=False, methods=["get"], permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        subscriptions = Subscription.objects.filter(user=request.user)
+        subscriptions = (
+            Subscription.objects.filter(user=request.user)
+            .select_related("author")
+            .order_by("-id")
+        )
         page = self.paginate_queryset(subscriptions)
+
+        # Рецепты всех авторов страницы получаем одним запросом
+        recipes_by_author = defaultdict(list)
+        recipes = Recipe.objects.latest_per_author(
+            [subscription.author_id for subscription in page],
+            get_recipes_limit(request),
+        ).order_by("author_id", "-pub_date", "-id")
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+
         serializer = SubscriptionSerializer(
-            page, many=True, context={"request": request}
+            page,
+            many=True,
+            context={
+                "request": request,
+                "recipes_by_author": recipes_by_author,
+            },
         )
         return self.get_paginated_response(serializer.data)
 
@@ -195,8 +270,15 @@ class UserViewSet(viewsets.ModelViewSet):
 
         if request.method == "POST":
             try:
-                # Используем related_name 'subscriber' для создания
-                subscription = request.user.subscriber.create(author=author)
+                with transaction.atomic():
+                    # Используем related_name 'subscriber' для создания
+                    subscription = request.user.subscriber.create(
+                        author=author
+                    )
+                    User.objects.filter(pk=author.pk).update(
+                        followers_count=F("followers_count") + 1
+                    )
+                    FeedEntry.objects.backfill(request.user, author)
 
                 serializer = SubscriptionSerializer(
                     subscription, context={"request": request}
@@ -223,129 +305,358 @@ class UserViewSet(viewsets.ModelViewSet):
                 {"errors": ["Вы не подписаны на этого автора"]},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        subscription.delete()
+        with transaction.atomic():
+            subscription.delete()
+            User.objects.filter(pk=author.pk).update(
+                followers_count=F("followers_count") - 1
+            )
+            FeedEntry.objects.prune(request.user, author)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ConditionalGetMixin, AnonymousCacheMixin, viewsets.ReadOnlyModelViewSet
+):
+    cache_tags = ("ingredients",)
+    validator_tags = ("ingredients",)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        if not set(params) <= CATALOG_PARAMS:
+            return super().list(request, *args, **kwargs)
+        # Поиск по названию обслуживает справочник в памяти процесса
+        prefix = params.get("name") or params.get("name__istartswith", "")
+        return self.conditional_response(
+            request,
+            lambda: HttpResponse(
+                catalog.search(
+                    prefix=prefix, substring=params.get("name__icontains", "")
+                ),
+                content_type="application/json",
+            ),
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(
+    ConditionalGetMixin, AnonymousCacheMixin, viewsets.ModelViewSet
+):
+    cache_tags = ("recipes", "rankings")
+    validator_fields = ("updated_at", "author__updated_at")
+    validator_tags = ("recipes", "rankings")
+    membership_kinds = ("favorites", "cart", "follows")
+    lookup_value_regex = r"\d+"
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly]
 
+    @property
+    def cursor_ordering(self):
+        """Ключ ?cursor= совпадает с сортировкой из ?ordering=.
+
+        Результаты ?search= упорядочены по релевантности, ключа у них
+        нет: None оставляет постраничный вывод по номеру страницы.
+        """
+        params = self.request.query_params
+        if self.action == "list":
+            if params.get("ordering") in ORDERING_POSITIONS:
+                return POSITION_ORDERING
+            if params.get("search"):
+                return None
+        return ("-pub_date", "-id")
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            # Остальное RecipeReadSerializer берет из кэша фрагментов
+            return Recipe.objects.for_fragments()
+        return Recipe.objects.for_read(self.request.user)
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        User.objects.filter(pk=recipe.author_id).update(
+            recipes_count=F("recipes_count") + 1
+        )
+        FeedEntry.objects.fan_out(recipe)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        old_amounts = dict(
+            instance.recipe_ingredients.values_list("ingredient_id", "amount")
+        )
+        ShoppingListItem.objects.change_recipe(instance, old_amounts, {})
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F("recipes_count") - 1
+        )
+        instance.delete()
 
     def get_object(self):
-        obj = get_object_or_404(Recipe, pk=self.kwargs["pk"])
+        obj = get_object_or_404(self.get_queryset(), pk=self.kwargs["pk"])
         self.check_object_permissions(self.request, obj)
         return obj
 
     @action(
-        detail=True,
-        methods=["post", "delete"],
-        permission_classes=[IsAuthenticated],
+        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
     )
-    def favorite(self, request, pk=None):
+    def feed(self, request):
+        user = request.user
+        direct_ids = FeedEntry.objects.direct_authors(user)
+        if direct_ids:
+            # Часть рецептов не скопирована в ленты, читаем их напрямую
+            page = self.paginate_queryset(
+                self.get_queryset()
+                .feed(user, direct_ids)
+                .order_by("-pub_date", "-id")
+            )
+        else:
+            entries = self.paginate_queryset(
+                user.feed_entries.order_by("-pub_date", "-id")
+            )
+            recipes = self.get_queryset().in_bulk(
+                [entry.recipe_id for entry in entries]
+            )
+            page = [
+                recipes[entry.recipe_id]
+                for entry in entries
+                if entry.recipe_id in recipes
+            ]
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из запасов пользователя."""
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ranked = pantry_index.rank(
+            params.validated_data["ingredients"],
+            params.validated_data.get("max_missing"),
+        )
+        paginator = ListPagination()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        page = [
+            (recipes[recipe_id], matched, missing)
+            for recipe_id, matched, missing in page
+            if recipe_id in recipes
+        ]
+        serializer = RecipeReadSerializer(
+            [recipe for recipe, _, _ in page],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        results = [
+            {**data, "matched_count": matched, "missing_count": missing}
+            for data, (_, matched, missing) in zip(serializer.data, page)
+        ]
+        return paginator.get_paginated_response(results)
+
+    @action(detail=True, methods=["get"])
+    def similar(self, request, pk=None):
+        """Рецепты с похожим составом, от самых похожих."""
         recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            limit = int(request.query_params.get("limit", SIMILAR_LIMIT))
+        except ValueError:
+            limit = SIMILAR_LIMIT
+        ranked = dict(
+            RecipeSignature.objects.similar(
+                recipe, min(max(limit, 1), MAX_SIMILAR_LIMIT)
+            )
+        )
+        recipes = Recipe.objects.in_bulk(list(ranked))
+        serializer = SimilarRecipeSerializer(
+            [
+                recipes[recipe_id]
+                for recipe_id in ranked
+                if recipe_id in recipes
+            ],
+            many=True,
+            context={**self.get_serializer_context(), "similarities": ranked},
+        )
+        return Response(serializer.data)
 
+    def toggle_recipe(self, request, pk, model, errors):
+        """Добавляет рецепт в избранное или корзину либо убирает оттуда."""
         if request.method == "POST":
-            if request.user.favorite.filter(recipe=recipe).exists():
+            recipe = get_object_or_404(Recipe, pk=pk)
+            if not model.objects.add(request.user, [recipe.pk]):
                 return Response(
-                    {"errors": "Рецепт уже в избранном"},
+                    {"errors": errors["exists"]},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            Favorite.objects.create(user=request.user, recipe=recipe)
-            serializer = RecipeShortSerializer(recipe)
+            serializer = RecipeShortSerializer(
+                recipe, context={"request": request}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        favorite = request.user.favorite.filter(recipe=recipe)
-        if not favorite.exists():
+        if not model.objects.remove(request.user, [int(pk)]):
+            get_object_or_404(Recipe, pk=pk)
             return Response(
-                {"errors": "Рецепта нет в избранном"},
+                {"errors": errors["missing"]},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        favorite.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def toggle_recipes(self, request, model):
+        """Добавляет или убирает сразу несколько рецептов."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+
+        if request.method == "DELETE":
+            model.objects.remove(request.user, recipe_ids)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        model.objects.add(request.user, recipe_ids)
+        serializer = RecipeShortSerializer(
+            Recipe.objects.filter(id__in=recipe_ids),
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         detail=True,
         methods=["post", "delete"],
         permission_classes=[IsAuthenticated],
     )
-    def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
+    def favorite(self, request, pk=None):
+        return self.toggle_recipe(
+            request,
+            pk,
+            Favorite,
+            {
+                "exists": "Рецепт уже в избранном",
+                "missing": "Рецепта нет в избранном",
+            },
+        )
 
-        if request.method == "POST":
-            if request.user.shopping_cart.filter(recipe=recipe).exists():
-                return Response(
-                    {"errors": "Рецепт уже в списке покупок"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            ShoppingCart.objects.create(user=request.user, recipe=recipe)
-            serializer = RecipeShortSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        permission_classes=[IsAuthenticated],
+        url_path="favorite",
+        url_name="favorite-bulk",
+    )
+    def favorite_bulk(self, request):
+        return self.toggle_recipes(request, Favorite)
 
-        shopping_cart = request.user.shopping_cart.filter(recipe=recipe)
-        if not shopping_cart.exists():
-            return Response(
-                {"errors": "Рецепта нет в списке покупок"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        shopping_cart.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(
+        detail=True,
+        methods=["post", "delete"],
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_cart(self, request, pk=None):
+        return self.toggle_recipe(
+            request,
+            pk,
+            ShoppingCart,
+            {
+                "exists": "Рецепт уже в списке покупок",
+                "missing": "Рецепта нет в списке покупок",
+            },
+        )
 
     @action(
-        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+        detail=False,
+        methods=["post", "delete"],
+        permission_classes=[IsAuthenticated],
+        url_path="shopping_cart",
+        url_name="shopping-cart-bulk",
+    )
+    def shopping_cart_bulk(self, request):
+        return self.toggle_recipes(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PlainTextRenderer,
+            CSVRenderer,
+            PDFRenderer,
+            JSONRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_carts__user=request.user
-            )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
+        export_format = request.accepted_renderer.format
+        if export_format not in SHOPPING_LIST_EXPORTS:
+            export_format = PlainTextRenderer.format
+        items = request.user.shopping_list.order_by("ingredient__name")
+
+        rows = items.values_list(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "total_amount",
         )
 
-        shopping_list = []
-        for ingredient in ingredients:
-            shopping_list.append(
-                f"{ingredient['ingredient__name']} - "
-                f"{ingredient['total_amount']} "
-                f"{ingredient['ingredient__measurement_unit']}"
+        # ETag зависит только от выгружаемых строк и формата выгрузки
+        digest = hashlib.sha1(export_format.encode())
+        for row in rows.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+            digest.update(repr(row).encode())
+        etag = quote_etag(digest.hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        renderer, export = SHOPPING_LIST_EXPORTS[export_format]
+        if export_format == PDFRenderer.format:
+            try:
+                response = HttpResponse(
+                    export(list(rows)), content_type=renderer.media_type
+                )
+            except OSError:
+                return HttpResponse(
+                    "Выгрузка в PDF недоступна",
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    content_type="text/plain; charset=utf-8",
+                )
+        else:
+            # Строки читаются из серверного курсора по мере отправки
+            response = StreamingHttpResponse(
+                export(rows.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)),
+                content_type=f"{renderer.media_type}; charset=utf-8",
             )
-
-        response = HttpResponse(
-            "\n".join(shopping_list), content_type="text/plain"
-        )
+        response["ETag"] = etag
         response["Content-Disposition"] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="{renderer.filename}.{export_format}"'
         )
         return response
 
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_link(self, request, pk=None):
-        recipe = self.get_object()
-        short_code = self.generate_short_code(recipe.id)
+        recipe = get_object_or_404(Recipe, pk=pk)
+        link = ShortLink.objects.for_recipe(recipe)
         return Response(
-            {"short-link": f"{request.build_absolute_uri('/')}s/{short_code}"}
+            {
+                "short-link": request.build_absolute_uri(
+                    reverse("short-link", args=[link.code])
+                )
+            }
         )
 
-    def generate_short_code(self, recipe_id):
-        import hashlib
 
-        return hashlib.sha1(str(recipe_id).encode()).hexdigest()[:3]
+def short_link_redirect(request, code):
+    """Перенаправляет короткую ссылку на страницу рецепта."""
+    recipe_id = short_links.get(code)
+    if recipe_id is None:
+        recipe_id = get_object_or_404(
+            ShortLink.objects.values_list("recipe_id", flat=True), code=code
+        )
+        short_links.set(code, recipe_id)
+    return redirect(f"/recipes/{recipe_id}/")
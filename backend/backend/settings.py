@@ -2,6 +2,7 @@ from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
 import os
+import tempfile
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR.parent / ".env")
@@ -88,6 +89,62 @@ else:
         }
     }
 
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_LOCATIONS = {
+    "locmem": "foodgram",
+    "file": os.path.join(tempfile.gettempdir(), "foodgram"),
+    "redis": "redis://redis:6379/0",
+}
+
+# Кэш в памяти не общий для процессов, для нескольких воркеров нужен
+# Redis. Ключи версий хранятся в нем без срока и при
+# maxmemory-policy volatile-lru не вытесняются (см. docker-compose.yml)
+CACHE_NAME = os.getenv("CACHE_BACKEND", "locmem" if DEBUG else "redis")
+CACHE_BACKEND = CACHE_BACKENDS[CACHE_NAME]
+CACHE_LOCATION = os.getenv("CACHE_LOCATION", CACHE_LOCATIONS[CACHE_NAME])
+# Лимит записей для locmem и file. Кэш в файлах при каждой записи
+# перечисляет весь свой каталог, поэтому лимит должен быть небольшим
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1000))
+CACHE_OPTIONS = {}
+if CACHE_NAME != "redis":
+    CACHE_OPTIONS = {"MAX_ENTRIES": CACHE_MAX_ENTRIES, "CULL_FREQUENCY": 10}
+
+# Версии тегов и справочников лежат отдельно: записей там единицы,
+# и вытеснение из основного кэша их не затрагивает
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": CACHE_LOCATION,
+        "OPTIONS": CACHE_OPTIONS,
+    },
+    "versions": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": (
+            CACHE_LOCATION
+            if CACHE_NAME == "redis"
+            else os.path.join(CACHE_LOCATION, "versions")
+        ),
+        "KEY_PREFIX": "versions",
+        "OPTIONS": CACHE_OPTIONS,
+    },
+}
+
+# Сколько секунд хранятся ответы анонимным пользователям
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300))
+
+# Фрагменты рецептов версионируются датами изменения и живут дольше
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", 86400))
+
+# Избранное, корзина и подписки пользователя сбрасываются при изменении
+MEMBERSHIP_CACHE_TIMEOUT = 3600
+
+# Списки рецептов ингредиентов тоже сбрасываются при изменении состава
+POSTING_CACHE_TIMEOUT = 86400
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -119,7 +176,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 10,
@@ -139,9 +196,46 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer", "Token"),
 }
 
+# Рецепты авторов с большим числом подписчиков не копируются в ленты,
+# а читаются при запросе ленты
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", 10000))
+
+# Сколько лучших совпадений полнотекстового поиска отдавать
+SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", 500))
+
+# Сколько самых новых рецептов отдавать при подборе по ингредиентам
+INGREDIENT_FILTER_LIMIT = int(os.getenv("INGREDIENT_FILTER_LIMIT", 1000))
+
+# Тренды: добавления в избранное и корзину за последние дни, вес
+# добавления падает вдвое каждые TRENDING_HALF_LIFE_HOURS часов
+TRENDING_WINDOW_DAYS = int(os.getenv("TRENDING_WINDOW_DAYS", 7))
+TRENDING_HALF_LIFE_HOURS = int(os.getenv("TRENDING_HALF_LIFE_HOURS", 24))
+
+# Сколько секунд пользователь из JWT хранится в кэше процесса
+AUTH_USER_CACHE_TTL = 60
+
+# Асинхронные представления для чтения, включать при запуске под ASGI
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "False") == "True"
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 AUTH_USER_MODEL = "users.User"
+
+# Размеры копий изображений, которые создаются при загрузке
+IMAGE_VARIANTS = {
+    "thumbnail": (150, 150),
+    "card": (480, 480),
+    "full": (1280, 1280),
+}
+# Формат копий: JPEG или WEBP
+IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "JPEG")
+# Потоки для создания копий в фоне, 0 - создавать сразу при сохранении
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+# Ограничения загружаемого изображения
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 6000))
+# Отдавать изображения в base64 вместо ссылок (совместимость)
+IMAGE_INLINE_BASE64 = os.getenv("IMAGE_INLINE_BASE64", "False") == "True"
@@ -20,10 +20,12 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
+from api.views import short_link_redirect
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    path("s/<str:code>", short_link_redirect, name="short-link"),
     path("redoc/", TemplateView.as_view(template_name="redoc.html")),
 ]
 
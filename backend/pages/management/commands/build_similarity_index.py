@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from api.models import Recipe, RecipeSignature
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает подписи MinHash и корзины LSH всех рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество рецептов, обрабатываемых за один проход",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                Recipe.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: options["batch_size"]]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            RecipeSignature.objects.refresh(pks)
+            total += len(pks)
+        self.stdout.write(
+            self.style.SUCCESS(f"Обработано рецептов: {total}")
+        )
@@ -0,0 +1,51 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.caching import invalidate_tags
+from api.models import Favorite, Recipe, RecipeRanking, ShoppingCart
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает таблицы лидеров: популярные рецепты и тренды. "
+        "Запускается по расписанию, например из cron"
+    )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+        half_life = timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS)
+        trending = defaultdict(float)
+        for model in (Favorite, ShoppingCart):
+            # Строки без даты добавления (старше поля) в тренды не входят
+            for recipe_id, created_at in (
+                model.objects.filter(
+                    created_at__isnull=False, created_at__gte=since
+                )
+                .values_list("recipe_id", "created_at")
+                .iterator()
+            ):
+                trending[recipe_id] += 0.5 ** ((now - created_at) / half_life)
+
+        # Популярность берется из счетчиков рецепта, без подсчета связей
+        RecipeRanking.objects.replace(
+            (
+                recipe_id,
+                favorites_count + shopping_carts_count,
+                round(trending.get(recipe_id, 0), 6),
+            )
+            for recipe_id, favorites_count, shopping_carts_count in (
+                Recipe.objects.values_list(
+                    "id", "favorites_count", "shopping_carts_count"
+                ).iterator()
+            )
+        )
+        invalidate_tags("rankings")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Рейтинги пересчитаны, в трендах рецептов: {len(trending)}"
+            )
+        )
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from api.catalog import catalog
 from api.models import Ingredient
 
 
@@ -8,4 +9,5 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         count = Ingredient.objects.count()
         Ingredient.objects.all().delete()
+        catalog.invalidate()
         self.stdout.write(self.style.SUCCESS(f"Удалено ингредиентов: {count}"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from api.models import Recipe
+from api.utils import generate_image_variants
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Создает копии изображений рецептов и аватаров всех размеров"
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        errors = []
+        sources = (
+            (Recipe.objects.exclude(image=""), "image"),
+            (User.objects.exclude(avatar="").exclude(avatar=None), "avatar"),
+        )
+        for queryset, field_name in sources:
+            for obj in queryset.only("pk", field_name).iterator():
+                field_file = getattr(obj, field_name)
+                try:
+                    generate_image_variants(
+                        field_file.storage, field_file.name
+                    )
+                    count += 1
+                except (OSError, ValueError) as error:
+                    errors.append(f"{field_file.name}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано файлов: {count}"))
+        if errors:
+            self.stdout.write(self.style.ERROR("\n".join(errors)))
@@ -1,65 +1,185 @@
+import csv
+import hashlib
 import json
+from pathlib import Path
 from django.core.management.base import BaseCommand
-from api.models import Ingredient
+from django.db import transaction
+from api.caching import invalidate_tags
+from api.catalog import catalog
+from api.models import Ingredient, IngredientImport
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+
+def file_checksum(filepath):
+    """SHA-256 содержимого файла, читаемого по частям."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_json_array(f):
+    """Отдает элементы JSON-массива по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        if not eof:
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                continue
+            if not buffer.startswith("["):
+                raise json.JSONDecodeError("Ожидается массив", buffer, 0)
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Элемент прочитан не полностью, дочитываем файл
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def iter_fixture(f, errors):
+    for index, item in enumerate(iter_json_array(f), start=1):
+        # Проверяем структуру Fixture
+        if not all(key in item for key in ["model", "pk", "fields"]):
+            errors.append(
+                f"Запись #{index}: неверный формат (ожидается Fixture)"
+            )
+            continue
+
+        fields = item["fields"]
+        if "name" not in fields or "measurement_unit" not in fields:
+            errors.append(
+                f"Запись #{index}: нет 'name' или 'measurement_unit' "
+                "в fields"
+            )
+            continue
+        yield fields["name"], fields["measurement_unit"]
+
+
+def iter_csv(f, errors):
+    for index, row in enumerate(csv.reader(f), start=1):
+        if len(row) != 2 or not all(row):
+            errors.append(
+                f"Строка #{index}: ожидается 'name,measurement_unit'"
+            )
+            continue
+        yield row[0], row[1]
+
+
+READERS = {
+    ".json": iter_fixture,
+    ".csv": iter_csv,
+}
 
 
 class Command(BaseCommand):
-    help = "Загружает ингредиенты из JSON-файла"
+    help = "Загружает ингредиенты из JSON-файла (Fixture) или CSV-файла"
 
     def add_arguments(self, parser):
-        parser.add_argument("filepath", type=str, help="Путь к JSON-файлу")
+        parser.add_argument(
+            "filepath", type=str, help="Путь к JSON- или CSV-файлу"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Загрузить файл, даже если он уже загружался",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество ингредиентов в одной вставке",
+        )
 
     def handle(self, *args, **options):
         filepath = options["filepath"]
+        reader = READERS.get(Path(filepath).suffix.lower())
+        if reader is None:
+            self.stderr.write(
+                self.style.ERROR("Поддерживаются только файлы .json и .csv")
+            )
+            return
+
         try:
+            checksum = file_checksum(filepath)
+            # Тот же файл уже загружен, повторно не читаем
+            if (
+                not options["force"]
+                and IngredientImport.objects.filter(checksum=checksum).exists()
+                and Ingredient.objects.exists()
+            ):
+                self.stdout.write(
+                    self.style.SUCCESS("Файл уже загружен, пропускаем")
+                )
+                return
+
+            errors = []
+            self.processed_count = 0
+            count_before = Ingredient.objects.count()
             with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                created_count = 0
-                skipped_count = 0
-                errors = []
-
-                for index, item in enumerate(data, start=1):
-                    # Проверяем структуру Fixture
-                    if not all(
-                        key in item for key in ["model", "pk", "fields"]
-                    ):
-                        errors.append(
-                            f"Запись #{index}: неверный формат (ожидается Fixture)"
-                        )
-                        skipped_count += 1
-                        continue
-
-                    fields = item["fields"]
-                    if (
-                        "name" not in fields
-                        or "measurement_unit" not in fields
-                    ):
-                        errors.append(
-                            f"Запись #{index}: нет 'name' или 'measurement_unit' в fields"
+                with transaction.atomic():
+                    batch = []
+                    for name, measurement_unit in reader(f, errors):
+                        batch.append(
+                            Ingredient(
+                                name=name, measurement_unit=measurement_unit
+                            )
                         )
-                        skipped_count += 1
-                        continue
+                        if len(batch) >= options["batch_size"]:
+                            self.save_batch(batch)
+                            batch = []
+                    self.save_batch(batch)
 
-                    # Создаём ингредиент
-                    obj, created = Ingredient.objects.get_or_create(
-                        name=fields["name"],
-                        measurement_unit=fields["measurement_unit"],
+                    IngredientImport.objects.update_or_create(
+                        checksum=checksum, defaults={"source": filepath}
                     )
-                    if created:
-                        created_count += 1
+            catalog.invalidate()
+            # bulk_create не отправляет сигналы, кэш ответов сбрасываем сами
+            invalidate_tags("ingredients", "recipes")
 
-                # Вывод результатов
+            # Вывод результатов
+            created_count = Ingredient.objects.count() - count_before
+            self.stdout.write(
+                self.style.SUCCESS(f"Загружено: {created_count}")
+            )
+            skipped_count = (
+                len(errors) + self.processed_count - created_count
+            )
+            if skipped_count:
                 self.stdout.write(
-                    self.style.SUCCESS(f"Загружено: {created_count}")
+                    self.style.WARNING(f"Пропущено: {skipped_count}")
                 )
-                if skipped_count:
-                    self.stdout.write(
-                        self.style.WARNING(f"Пропущено: {skipped_count}")
-                    )
-                if errors:
-                    self.stdout.write(self.style.ERROR("\n".join(errors)))
+            if errors:
+                self.stdout.write(self.style.ERROR("\n".join(errors)))
 
         except FileNotFoundError:
             self.stderr.write(self.style.ERROR(f"Файл не найден: {filepath}"))
         except json.JSONDecodeError:
             self.stderr.write(self.style.ERROR("Ошибка формата JSON"))
+
+    def save_batch(self, batch):
+        """Вставляет пачку ингредиентов, пропуская уже существующие."""
+        if not batch:
+            return
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        self.processed_count += len(batch)
+        self.stdout.write(f"Обработано записей: {self.processed_count}")
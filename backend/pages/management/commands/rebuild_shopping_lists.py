@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from api.models import RecipeIngredient, ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает списки покупок из корзин и сверяет их "
+        "с подсчетом по рецептам"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только сверить списки, не пересобирая их",
+        )
+
+    def live_totals(self):
+        """Суммы ингредиентов, посчитанные заново по корзинам."""
+        rows = (
+            RecipeIngredient.objects.filter(
+                recipe__shopping_carts__isnull=False
+            )
+            .values_list("recipe__shopping_carts__user", "ingredient")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows
+        }
+
+    def stored_totals(self):
+        rows = ShoppingListItem.objects.values_list(
+            "user_id", "ingredient_id", "total_amount"
+        )
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows
+        }
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            with transaction.atomic():
+                ShoppingListItem.objects.all().delete()
+                ShoppingListItem.objects.bulk_create(
+                    (
+                        ShoppingListItem(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=total,
+                        )
+                        for (user_id, ingredient_id), total in (
+                            self.live_totals().items()
+                        )
+                    ),
+                    batch_size=BATCH_SIZE,
+                )
+
+        live = self.live_totals()
+        stored = self.stored_totals()
+        mismatches = [
+            key
+            for key in live.keys() | stored.keys()
+            if live.get(key) != stored.get(key)
+        ]
+        if mismatches:
+            raise CommandError(
+                f"Расхождений со списками покупок: {len(mismatches)}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Позиций в списках покупок: {len(stored)}")
+        )
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from api.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+BATCH_SIZE = 1000
+
+# Модель со счетчиком, поле счетчика, подсчитываемая модель и ее связь
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "shopping_carts_count", ShoppingCart, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Subscription, "author"),
+)
+
+
+def count_of(model, field):
+    """Подзапрос с количеством связанных строк."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Сверяет счетчики рецептов и пользователей и исправляет расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество строк, проверяемых за один проход",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только найти расхождения, не исправляя их",
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            live = count_of(related_model, related_field)
+            fixed = 0
+            last_pk = 0
+            while True:
+                pks = list(
+                    model.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[: options["batch_size"]]
+                )
+                if not pks:
+                    break
+                last_pk = pks[-1]
+                with transaction.atomic():
+                    drifted = list(
+                        model.objects.filter(pk__in=pks)
+                        .annotate(live=live)
+                        .exclude(**{field: F("live")})
+                        .values_list("pk", flat=True)
+                    )
+                    if drifted and not options["check"]:
+                        model.objects.filter(pk__in=drifted).update(
+                            **{field: live}
+                        )
+                fixed += len(drifted)
+
+            message = f"{model._meta.model_name}.{field}: {fixed}"
+            if fixed:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                self.stdout.write(self.style.SUCCESS(message))
@@ -5,7 +5,14 @@ from .models import User, Subscription
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ("email", "username", "first_name", "last_name")
+    list_display = (
+        "email",
+        "username",
+        "first_name",
+        "last_name",
+        "recipes_count",
+        "followers_count",
+    )
     search_fields = ("email", "username")
     list_filter = ("email", "username")
     empty_value_display = "-пусто-"
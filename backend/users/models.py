@@ -1,9 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from api.utils import Base64ImageField
+from api.utils import Base64ImageField, CounterFieldsMixin
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     """Модель пользователя с дополнительными полями"""
 
     email = models.EmailField("Email", max_length=254, unique=True)
@@ -15,6 +15,15 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+    recipes_count = models.PositiveIntegerField(
+        "Рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        "Подписчиков", default=0, editable=False
+    )
+
+    counter_fields = ("recipes_count", "followers_count")
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
@@ -48,6 +57,11 @@ class Subscription(models.Model):
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         ordering = ["-id"]
+        indexes = [
+            models.Index(
+                fields=["user", "-id"], name="subscription_user_id_idx"
+            )
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "author"], name="unique_subscription"